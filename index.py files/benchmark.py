@@ -0,0 +1,346 @@
+"""Micro-benchmarks for the XClient activity tracker.
+
+Usage:
+    python benchmark.py sources [--lang en|fr] [--repeat N]
+    python benchmark.py record --file snapshots.jsonl.gz [--applications applications.json]
+                               [--seconds 60] [--interval 1]
+    python benchmark.py replay [--file snapshots.jsonl.gz --applications applications.json]
+                               [--processes 10000] [--apps 1000] [--duration 3600]
+    python benchmark.py memory [--sessions 100000] [--apps 1000]
+    python benchmark.py stats [--apps 100] [--repeat N]
+
+`replay` without --file generates a synthetic workload instead.
+
+The tracker lives in index-<lang>.py, which is loaded as a module without
+starting the Tk interface, so this also runs on a headless machine.
+"""
+import argparse
+import contextlib
+import importlib.util
+import inspect
+import io
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+
+os.environ.setdefault("PYSTRAY_BACKEND", "dummy")
+
+
+def load_xclient(lang):
+
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), f"index-{lang}.py")
+    spec = importlib.util.spec_from_file_location("xclient", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _timed(func, repeat):
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_sources(xclient, args):
+
+    sources = [("psutil", xclient.PsutilProcessSource)]
+    if xclient.ProcProcessSource.is_available():
+        sources.append(("/proc", xclient.ProcProcessSource))
+    else:
+        print("/proc is not available on this machine, only psutil is measured")
+
+
+    names = set()
+    for proc in xclient.psutil.process_iter(["name"]):
+        if proc.info.get("name"):
+            names.add(proc.info["name"])
+    applications = [{"name": name, "exe": name} for name in sorted(names)[::3]]
+    matcher = xclient.ProcessMatcher(applications)
+
+    print(f"{len(names)} process names, {len(applications)} configured apps, {args.repeat} runs")
+    print(f"{'source':<10}{'full scan (ms)':>16}{'steady scan (ms)':>18}")
+    for label, factory in sources:
+        full = _timed(lambda: xclient.ProcessScanner(factory()).scan(matcher), args.repeat)
+
+        scanner = xclient.ProcessScanner(factory())
+        scanner.scan(matcher)
+        steady = _timed(lambda: scanner.scan(matcher), args.repeat)
+
+        print(f"{label:<10}{full * 1000:>16.2f}{steady * 1000:>18.3f}")
+
+
+def load_applications(xclient, path):
+
+    with open(path, "r") as f:
+        return xclient.ensure_data_schema(json.load(f))["applications"]
+
+
+def bench_record(xclient, args):
+
+    # exe/cmdline are only recorded when a rule asks for them, so scan with
+    # the same applications the recording will be replayed against
+    if os.path.exists(args.applications):
+        applications = load_applications(xclient, args.applications)
+    else:
+        print(f"{args.applications} not found: exe and cmdline rules will not match on replay")
+        applications = []
+    source = xclient.RecordingProcessSource(xclient.default_process_source(), args.file)
+    scanner = xclient.ProcessScanner(source)
+    matcher = xclient.ProcessMatcher(applications)
+    deadline = time.monotonic() + args.seconds
+    frames = 0
+    try:
+        while time.monotonic() < deadline:
+            scanner.scan(matcher)
+            frames += 1
+            time.sleep(args.interval)
+    finally:
+        source.close()
+    print(f"{frames} frames recorded to {args.file} ({os.path.getsize(args.file) / 1024:.1f} KiB)")
+
+
+def synthetic_workload(process_count, app_count, duration, seed=0):
+    """Background processes plus app sessions of 1 to 60 minutes, started and
+    stopped at random. Returns (applications, frames, true sessions)."""
+    rng = random.Random(seed)
+    applications = [{"name": f"App {i}", "exe": f"C:/Program Files/App{i}/app{i}.exe"}
+                    for i in range(app_count)]
+    start = 1_700_000_000.0
+    next_pid = 1000
+
+    added = []
+    background = []
+    for i in range(process_count):
+        added.append([next_pid, 4, start - 600, f"service{i}.exe"])
+        background.append(next_pid)
+        next_pid += 1
+    frames = [{"t": start, "add": added, "del": []}]
+
+    running = {}
+    sessions = []
+    t = start
+    while t < start + duration:
+        t += 1.0
+        added, removed = [], []
+
+        for _ in range(3):
+            index = rng.randrange(len(background))
+            removed.append(background[index])
+            added.append([next_pid, 4, t, f"worker{next_pid}.exe"])
+            background[index] = next_pid
+            next_pid += 1
+
+        for app_index, (pids, began, ends) in list(running.items()):
+            if t >= ends:
+                removed.extend(pids)
+                sessions.append((applications[app_index]["name"], began, t))
+                del running[app_index]
+
+        if rng.random() < 0.05 and len(running) < app_count:
+            app_index = rng.randrange(app_count)
+            if app_index not in running:
+                root = next_pid
+                pids = [root + k for k in range(rng.randint(1, 4))]
+                next_pid += len(pids)
+                for k, pid in enumerate(pids):
+                    added.append([pid, 4 if k == 0 else root, t, f"app{app_index}.exe"])
+                running[app_index] = (pids, t, t + rng.uniform(60, 3600))
+
+        frames.append({"t": t, "add": added, "del": removed})
+
+    t += 1.0
+    removed = []
+    for app_index, (pids, began, _) in running.items():
+        removed.extend(pids)
+        sessions.append((applications[app_index]["name"], began, t))
+    frames.append({"t": t, "add": [], "del": removed})
+    return applications, frames, sessions
+
+
+def bench_replay(xclient, args):
+
+    if args.file:
+        applications = load_applications(xclient, args.applications)
+        source = xclient.ReplayProcessSource.from_file(args.file)
+        truth = None
+        label = args.file
+    else:
+        applications, frames, truth = synthetic_workload(args.processes, args.apps, args.duration, args.seed)
+        source = xclient.ReplayProcessSource(frames)
+        label = f"synthetic: {args.processes} processes, {args.apps} apps, {args.duration}s"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tracker = xclient.ActivityTracker(SimpleNamespace(applications=applications),
+                                          process_source=source, clock=source.clock,
+                                          activity_file=os.path.join(tmp, "activity_data.json"))
+        scheduler = tracker.scheduler
+        scan_times = []
+        checks = 0
+        began = source.time
+        with contextlib.redirect_stdout(io.StringIO()):
+            source.advance()
+            running = True
+            while running:
+                t0 = time.perf_counter()
+                changed = tracker.poll()
+                scan_times.append(time.perf_counter() - t0)
+                scheduler.record_scan(changed)
+                # same wakeups as _tracking_loop: liveness checks every
+                # min_interval while apps run, a full scan at the interval
+                next_scan = source.time + scheduler.interval
+                while running:
+                    if not tracker.running_apps:
+                        running = source.advance(next_scan)
+                        break
+                    running = source.advance(min(next_scan, source.time + scheduler.min_interval))
+                    if source.time >= next_scan:
+                        break
+                    checks += 1
+                    if not tracker.running_alive():
+                        break
+            tracker.poll()
+            tracker.stop_tracking()
+
+        # sessions of past months are sealed into the archive by the final save
+        recorded = {}
+        for app_name in tracker.activities:
+            for start, end, _ in tracker.store.sessions.sessions(app_name):
+                recorded.setdefault(app_name, []).append((start, end))
+        for app_name, start, end in tracker.store.archive.rows():
+            recorded.setdefault(app_name, []).append((start, end))
+
+    print(label)
+    elapsed = source.time - began
+    print(f"  {len(scan_times)} scans and {checks} liveness checks over {elapsed / 3600:.1f} h of virtual time "
+          f"({(len(scan_times) + checks) / max(elapsed, 1):.2f} wakeups/s)")
+    print(f"  first scan {scan_times[0] * 1000:.1f} ms, "
+          f"steady median {statistics.median(scan_times[1:] or scan_times) * 1000:.3f} ms, "
+          f"max {max(scan_times[1:] or scan_times) * 1000:.3f} ms")
+    if truth is None:
+        return
+
+    start_delays, end_delays, missed = [], [], 0
+    for app_name, true_start, true_end in truth:
+        candidates = [s for s in recorded.get(app_name, []) if s[0] <= true_end and s[1] >= true_start]
+        if not candidates:
+            missed += 1
+            continue
+        found = min(candidates, key=lambda s: abs(s[0] - true_start))
+        start_delays.append(found[0] - true_start)
+        end_delays.append(found[1] - true_end)
+
+    print(f"  {len(truth)} true sessions, {len(truth) - missed} detected, "
+          f"{sum(len(v) for v in recorded.values())} recorded")
+    if start_delays:
+        print(f"  start latency: mean {statistics.mean(start_delays):.2f}s, max {max(start_delays):.2f}s")
+        print(f"  stop latency:  mean {statistics.mean(end_delays):.2f}s, max {max(end_delays):.2f}s")
+
+
+def bench_memory(xclient, args):
+
+    rng = random.Random(args.seed)
+    start = datetime(2024, 1, 1).timestamp()
+    rows = []
+    for i in range(args.sessions):
+        began = start + i * 600
+        duration = rng.uniform(5, 3600)
+        rows.append((f"App {i % args.apps}", began, began + duration, duration))
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    as_dicts = {}
+    for app_name, began, ended, duration in rows:
+        as_dicts.setdefault(app_name, []).append({
+            "start": datetime.fromtimestamp(began),
+            "end": datetime.fromtimestamp(ended),
+            "duration": duration
+        })
+    dict_bytes = tracemalloc.get_traced_memory()[0] - before
+    del as_dicts
+
+    before = tracemalloc.get_traced_memory()[0]
+    store = xclient.SessionStore()
+    for app_name, began, ended, duration in rows:
+        store.append(app_name, began, ended, duration)
+    store_bytes = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    print(f"{args.sessions} sessions over {args.apps} apps")
+    print(f"  list of dicts:  {dict_bytes / 1024 / 1024:8.2f} MiB ({dict_bytes / args.sessions:.0f} B/session)")
+    print(f"  SessionStore:   {store_bytes / 1024 / 1024:8.2f} MiB ({store_bytes / args.sessions:.0f} B/session)")
+    print(f"  overlap_totals: {_timed(lambda: store.overlap_totals(start, start + 86400), args.repeat) * 1000:.2f} ms")
+
+
+def bench_stats(xclient, args):
+
+    engine = xclient.StatsEngine
+    today = datetime.now().date()
+    rollup_days = [(days, (today - timedelta(days=days - 1)).isoformat()) for days in (1, 7, 30, 36500)]
+    print(f"daily rollup rows over {args.apps} apps, {len(rollup_days)} periods, {args.repeat} runs")
+    print(f"{'rows':>8}{'python (ms)':>14}{'numpy, export (ms)':>21}{'numpy, exported (ms)':>23}")
+    crossover = None
+    for rows in (100, 300, 1000, 3000, 10000, 30000, 100000, 300000):
+        if rows < args.apps:
+            continue
+        days_per_app = rows // args.apps
+        activities = {
+            f"App {i}": {"daily": {(today - timedelta(days=d)).isoformat(): [3600.0, 2, 2]
+                                   for d in range(days_per_app)}}
+            for i in range(args.apps)
+        }
+        names = list(activities)
+        python = _timed(lambda: engine.rollup_totals_python(activities, names, rollup_days), args.repeat)
+        numpy = _timed(lambda: engine.rollup_totals_numpy([engine.export_rollups(activities[name]["daily"])
+                                                           for name in names], rollup_days), args.repeat)
+        exported = [engine.export_rollups(activities[name]["daily"]) for name in names]
+        cached = _timed(lambda: engine.rollup_totals_numpy(exported, rollup_days), args.repeat)
+        if crossover is None and cached < python:
+            crossover = days_per_app * args.apps
+        print(f"{days_per_app * args.apps:>8}{python * 1000:>14.3f}{numpy * 1000:>21.3f}{cached * 1000:>23.3f}")
+    default = inspect.signature(engine).parameters["vectorize_from"].default
+    if crossover:
+        print(f"NumPy is faster from about {crossover} rows (StatsEngine.vectorize_from is {default})")
+    else:
+        print("NumPy was never faster at these sizes")
+
+
+BENCHMARKS = {
+    "sources": bench_sources,
+    "record": bench_record,
+    "replay": bench_replay,
+    "memory": bench_memory,
+    "stats": bench_stats,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="XClient tracker benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--lang", choices=["en", "fr"], default="en")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--file", help="snapshot file to record to or replay from")
+    parser.add_argument("--applications", default="applications.json",
+                        help="applications.json used to match a recorded or replayed file")
+    parser.add_argument("--seconds", type=float, default=60, help="recording length")
+    parser.add_argument("--interval", type=float, default=1, help="recording scan interval")
+    parser.add_argument("--processes", type=int, default=10000, help="synthetic background processes")
+    parser.add_argument("--apps", type=int, default=None, help="synthetic configured apps")
+    parser.add_argument("--duration", type=int, default=3600, help="synthetic virtual seconds")
+    parser.add_argument("--sessions", type=int, default=100000, help="sessions held in memory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.apps is None:
+        args.apps = 100 if args.benchmark == "stats" else 1000
+    if args.benchmark == "record" and not args.file:
+        parser.error("record needs --file")
+
+    BENCHMARKS[args.benchmark](load_xclient(args.lang), args)
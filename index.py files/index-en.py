@@ -2,71 +2,1835 @@ import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import subprocess
 import json
+import sqlite3
+import gzip
 import os
+import re
+import fnmatch
 import webbrowser
 from PIL import Image, ImageTk, ImageDraw, ImageChops
 import shutil
 from pystray import Icon, MenuItem, Menu
 import threading
+from collections import deque
+from types import MappingProxyType
+from array import array
+from bisect import bisect_left, bisect_right
 from tkinter import simpledialog
 import time
 from datetime import datetime, timedelta
 import psutil
+import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 
 
+class ProcessMatcher:
+    """Hash-indexed lookup from process names/paths, and the "match" rules of applications.json, to applications."""
+    def __init__(self, applications):
+        self.by_name = {}
+        self.by_base = {}
+        self.by_path = {}
+        self.by_prefix = {}
+        self.rules = []
+        self.rule_names = {}
+        self.glob_rules = []
+        self.ungated_rules = []
+        
+        for app in applications:
+            if app.get("match") and self._add_rule(app["name"], app["match"]):
+                continue
+            
+            exe_path = (app.get("exe") or "").lower()
+            if not exe_path or exe_path.endswith('.url') or exe_path.startswith(('http://', 'https://')):
+                continue
+            
+            exe_filename = os.path.basename(exe_path)
+            exe_base = os.path.splitext(exe_filename)[0]
+            
+            if exe_filename:
+                self.by_name.setdefault(exe_filename, []).append(app["name"])
+            if len(exe_filename) > 15:
+                self.by_prefix.setdefault(exe_filename[:15], []).append(app["name"])
+            if exe_base:
+                self.by_base.setdefault(exe_base, []).append(app["name"])
+            self.by_path.setdefault(os.path.normpath(exe_path), []).append(app["name"])
+        
+        self.glob_filter = self._combine(pattern.pattern for _, pattern in self.glob_rules)
+        self.exe_filter = self._combine(self.rules[i][2].pattern for i in self.ungated_rules if self.rules[i][2])
+        self.cmdline_filter = self._combine(self.rules[i][3].pattern for i in self.ungated_rules if self.rules[i][3])
+    
+    def _add_rule(self, app_name, spec):
+        
+        def as_list(value):
+            return [value] if isinstance(value, str) else list(value or [])
+        
+        try:
+            names = {name.lower() for name in as_list(spec.get("names"))}
+            globs = as_list(spec.get("glob"))
+            glob_re = re.compile("|".join(f"(?:{fnmatch.translate(g.lower())})" for g in globs)) if globs else None
+            exe_re = re.compile(spec["exe_regex"], re.IGNORECASE) if spec.get("exe_regex") else None
+            cmdline_re = re.compile(spec["cmdline_regex"], re.IGNORECASE) if spec.get("cmdline_regex") else None
+        except (AttributeError, TypeError, re.error) as e:
+            print(f"[Tracker] Invalid match rule for {app_name}: {e}")
+            return False
+        if not (names or glob_re or exe_re or cmdline_re):
+            return False
+        
+        index = len(self.rules)
+        self.rules.append((app_name, names, exe_re, cmdline_re, glob_re))
+        for name in names:
+            self.rule_names.setdefault(name, []).append(index)
+        if glob_re:
+            self.glob_rules.append((index, glob_re))
+        if not names and not glob_re:
+            self.ungated_rules.append(index)
+        return True
+    
+    @staticmethod
+    def _combine(patterns):
+        
+        patterns = list(patterns)
+        if not patterns:
+            return None
+        try:
+            return re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+        except re.error:
+            return re.compile("")
+    
+    @staticmethod
+    def signature(applications):
+        
+        return tuple((app.get("name"), app.get("exe"), repr(app.get("match"))) for app in applications)
+    
+    def match(self, proc_name, fetch=None):
+        """Returns the set of app names matching a lowercased process name.
+
+        `fetch(attr)` lazily returns the process "exe" (lowercased) or
+        "cmdline"; it is only called when a candidate needs it.
+        """
+        matched = set()
+        
+        apps = self.by_name.get(proc_name)
+        if apps:
+            matched.update(apps)
+        
+        apps = self.by_base.get(os.path.splitext(proc_name)[0])
+        if apps:
+            matched.update(apps)
+        
+        if fetch and proc_name in self.by_prefix:
+            proc_exe = fetch("exe")
+            if proc_exe:
+                apps = self.by_path.get(os.path.normpath(proc_exe))
+                if apps:
+                    matched.update(apps)
+                apps = self.by_name.get(os.path.basename(proc_exe))
+                if apps:
+                    matched.update(apps)
+        
+        if self.rules:
+            matched.update(self._match_rules(proc_name, fetch))
+        return matched
+    
+    def _match_rules(self, proc_name, fetch):
+        
+        candidates = set(self.rule_names.get(proc_name, ()))
+        if self.glob_filter and self.glob_filter.match(proc_name):
+            candidates.update(index for index, pattern in self.glob_rules if pattern.match(proc_name))
+        
+        if self.ungated_rules and fetch:
+            if ((self.exe_filter and self.exe_filter.search(fetch("exe") or ""))
+                    or (self.cmdline_filter and self.cmdline_filter.search(fetch("cmdline") or ""))):
+                candidates.update(self.ungated_rules)
+        
+        matched = []
+        for index in candidates:
+            app_name, names, exe_re, cmdline_re, glob_re = self.rules[index]
+            if names and proc_name not in names:
+                continue
+            if glob_re and not glob_re.match(proc_name):
+                continue
+            if exe_re and not (fetch and exe_re.search(fetch("exe") or "")):
+                continue
+            if cmdline_re and not (fetch and cmdline_re.search(fetch("cmdline") or "")):
+                continue
+            matched.append(app_name)
+        return matched
+
+class PsutilProcessSource:
+    """Portable process source backed by psutil, used wherever /proc is missing."""
+    def __init__(self):
+        self._procs = {}
+    
+    def pids(self):
+        
+        return set(psutil.pids())
+    
+    def identify(self, pid):
+        
+        proc = psutil.Process(pid)
+        proc_name = proc.name() or ""
+        self._procs[pid] = proc
+        return proc_name, proc.create_time()
+    
+    def attribute(self, pid, attr):
+        
+        proc = self._procs.get(pid) or psutil.Process(pid)
+        return getattr(proc, attr)()
+    
+    def ppid(self, pid):
+        
+        proc = self._procs.get(pid) or psutil.Process(pid)
+        return proc.ppid()
+    
+    def is_alive(self, pid, create_time):
+        
+        try:
+            proc = self._procs.get(pid) or psutil.Process(pid)
+            return proc.create_time() == create_time and proc.is_running()
+        except psutil.Error:
+            return False
+    
+    def forget(self, pid):
+        
+        self._procs.pop(pid, None)
+
+
+class ProcProcessSource:
+    """Linux fast path that reads the name and start time from /proc/<pid>/stat."""
+    def __init__(self, proc_root="/proc"):
+        self.proc_root = proc_root
+        self._boot_time = psutil.boot_time()
+        self._clock_ticks = os.sysconf("SC_CLK_TCK")
+        self._ppids = {}
+    
+    @staticmethod
+    def is_available(proc_root="/proc"):
+        
+        return os.path.exists(os.path.join(proc_root, "self", "stat"))
+    
+    def pids(self):
+        
+        with os.scandir(self.proc_root) as entries:
+            return {int(entry.name) for entry in entries if entry.name.isdigit()}
+    
+    def _read(self, pid, name):
+        
+        try:
+            with open(f"{self.proc_root}/{pid}/{name}", "rb") as f:
+                return f.read()
+        except (FileNotFoundError, ProcessLookupError):
+            raise psutil.NoSuchProcess(pid)
+        except PermissionError:
+            raise psutil.AccessDenied(pid)
+    
+    def identify(self, pid):
+        
+        stat = self._read(pid, "stat")
+        lpar = stat.find(b"(")
+        rpar = stat.rfind(b")")
+        if lpar < 0 or rpar < lpar:
+            raise psutil.NoSuchProcess(pid)
+        proc_name = stat[lpar + 1:rpar].decode("utf-8", "replace")
+        fields = stat[rpar + 2:].split()
+        create_time = self._boot_time + int(fields[19]) / self._clock_ticks
+        self._ppids[pid] = int(fields[1])
+        return proc_name, create_time
+    
+    def ppid(self, pid):
+        
+        if pid not in self._ppids:
+            self.identify(pid)
+        return self._ppids[pid]
+    
+    def is_alive(self, pid, create_time):
+        
+        try:
+            return self.identify(pid)[1] == create_time
+        except psutil.Error:
+            return False
+    
+    def attribute(self, pid, attr):
+        
+        if attr == "exe":
+            try:
+                exe = os.readlink(f"{self.proc_root}/{pid}/exe")
+            except (FileNotFoundError, ProcessLookupError):
+                raise psutil.NoSuchProcess(pid)
+            except PermissionError:
+                raise psutil.AccessDenied(pid)
+            return exe[:-len(" (deleted)")] if exe.endswith(" (deleted)") else exe
+        if attr == "cmdline":
+            raw = self._read(pid, "cmdline")
+            return [arg.decode("utf-8", "replace") for arg in raw.split(b"\0") if arg]
+        raise ValueError(f"Unsupported process attribute: {attr}")
+    
+    def forget(self, pid):
+        
+        self._ppids.pop(pid, None)
+
+
+class RecordingProcessSource:
+    """Wraps another source and records every scan as one gzip'd JSON line for ReplayProcessSource."""
+    def __init__(self, inner, path):
+        self.inner = inner
+        self.path = path
+        self._known = {}
+        self._frame = None
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+    
+    def pids(self):
+        
+        self._write_frame()
+        pids = self.inner.pids()
+        
+        removed = [pid for pid in self._known if pid not in pids]
+        for pid in removed:
+            del self._known[pid]
+        
+        added = []
+        for pid in sorted(pids - self._known.keys()):
+            try:
+                proc_name, create_time = self.inner.identify(pid)
+                ppid = self.inner.ppid(pid)
+            except psutil.NoSuchProcess:
+                continue
+            except psutil.AccessDenied:
+                proc_name, create_time, ppid = None, 0, 0
+            self._known[pid] = (proc_name, create_time, ppid)
+            added.append([pid, ppid, create_time, proc_name])
+        
+        self._frame = {"t": round(time.time(), 3), "add": added, "del": removed, "attr": []}
+        return set(self._known)
+    
+    def identify(self, pid):
+        
+        if pid not in self._known:
+            return self.inner.identify(pid)
+        proc_name, create_time, _ = self._known[pid]
+        if proc_name is None:
+            raise psutil.AccessDenied(pid)
+        return proc_name, create_time
+    
+    def ppid(self, pid):
+        
+        if pid in self._known:
+            return self._known[pid][2]
+        return self.inner.ppid(pid)
+    
+    def attribute(self, pid, attr):
+        
+        value = self.inner.attribute(pid, attr)
+        if self._frame is not None:
+            self._frame["attr"].append([pid, attr, value])
+        return value
+    
+    def is_alive(self, pid, create_time):
+        
+        return self.inner.is_alive(pid, create_time)
+    
+    def forget(self, pid):
+        
+        self.inner.forget(pid)
+    
+    def _write_frame(self):
+        
+        if self._frame is None:
+            return
+        if not self._frame["attr"]:
+            del self._frame["attr"]
+        self._file.write(json.dumps(self._frame, separators=(",", ":")) + "\n")
+        self._frame = None
+    
+    def close(self):
+        
+        self._write_frame()
+        self._file.close()
+
+
+def load_process_snapshots(path):
+    
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class ReplayProcessSource:
+    """Plays back recorded or synthetic snapshot frames on a virtual clock moved by `advance`."""
+    def __init__(self, frames):
+        self._frames = iter(frames)
+        self._next = next(self._frames, None)
+        self.table = {}
+        self.attrs = {}
+        self.time = self._next["t"] if self._next else time.time()
+    
+    @classmethod
+    def from_file(cls, path):
+        
+        return cls(load_process_snapshots(path))
+    
+    def advance(self, until=None):
+        """Applies the frames up to `until` (default: the next frame) and
+        returns False once the recording is exhausted."""
+        if until is None:
+            until = self._next["t"] if self._next else self.time
+        while self._next is not None and self._next["t"] <= until:
+            frame = self._next
+            for pid in frame.get("del", ()):
+                self.table.pop(pid, None)
+                self.attrs.pop(pid, None)
+            for pid, ppid, create_time, proc_name in frame.get("add", ()):
+                self.table[pid] = (proc_name, create_time, ppid)
+            for pid, attr, value in frame.get("attr", ()):
+                self.attrs.setdefault(pid, {})[attr] = value
+            self._next = next(self._frames, None)
+        self.time = max(self.time, until)
+        return self._next is not None
+    
+    def clock(self):
+        
+        return datetime.fromtimestamp(self.time)
+    
+    def pids(self):
+        
+        return set(self.table)
+    
+    def identify(self, pid):
+        
+        proc = self.table.get(pid)
+        if proc is None:
+            raise psutil.NoSuchProcess(pid)
+        if proc[0] is None:
+            raise psutil.AccessDenied(pid)
+        return proc[0], proc[1]
+    
+    def ppid(self, pid):
+        
+        self.identify(pid)
+        return self.table[pid][2]
+    
+    def attribute(self, pid, attr):
+        
+        value = self.attrs.get(pid, {}).get(attr)
+        if value is None:
+            self.identify(pid)
+            raise psutil.AccessDenied(pid)
+        return value
+    
+    def is_alive(self, pid, create_time):
+        
+        proc = self.table.get(pid)
+        return proc is not None and proc[1] == create_time
+    
+    def forget(self, pid):
+        
+        pass
+
+
+def default_process_source():
+    
+    if ProcProcessSource.is_available():
+        return ProcProcessSource()
+    return PsutilProcessSource()
+
+
+class ProcessScanner:
+    """Incremental process table: per-app instances, keyed by root process, updated from PID diffs."""
+    def __init__(self, source=None):
+        self.source = source or default_process_source()
+        self.processes = {}
+        self.app_instances = {}
+        self.attributes = {}
+        self.bound = {}
+        self._matcher = None
+    
+    def scan(self, matcher):
+        
+        if matcher is not self._matcher:
+            self._rematch(matcher)
+        
+        current_pids = self.source.pids()
+        known_pids = set(self.processes)
+        
+        for pid in known_pids - current_pids:
+            self._forget(pid)
+        # a PID reused between two scans is in both sets: re-check the start
+        # time of the matched ones so a recycled PID cannot keep an app running
+        matched = {pid for instances in self.app_instances.values() for pids in instances.values() for pid in pids}
+        for pid in sorted(matched):
+            if not self.source.is_alive(pid, self.processes[pid]["key"][1]):
+                self._forget(pid)
+                if pid in current_pids:
+                    self._inspect(pid)
+        for pid in sorted(current_pids - known_pids):
+            self._inspect(pid)
+        
+        return self.app_instances
+    
+    def bind(self, pid, app_name):
+        """Ties a PID launched by XClient (and its future children) to an app."""
+        try:
+            create_time = self.source.identify(pid)[1]
+        except psutil.Error:
+            return False
+        self.bound[pid] = (app_name, create_time)
+        return True
+    
+    def bound_apps(self):
+        """Checks bound PIDs one by one and returns the apps still alive."""
+        apps = set()
+        for pid, (app_name, create_time) in list(self.bound.items()):
+            if self.source.is_alive(pid, create_time):
+                apps.add(app_name)
+            else:
+                del self.bound[pid]
+        return apps
+    
+    def live_apps(self):
+        """Apps with a live matched or bound process, checked PID by PID without listing processes."""
+        apps = self.bound_apps()
+        for app_name, instances in self.app_instances.items():
+            if any(self.source.is_alive(pid, self.processes[pid]["key"][1])
+                   for pids in instances.values() for pid in pids):
+                apps.add(app_name)
+        return apps
+    
+    def _inspect(self, pid):
+        
+        try:
+            proc_name, create_time = self.source.identify(pid)
+        except psutil.NoSuchProcess:
+            return
+        except psutil.AccessDenied:
+            self.processes[pid] = {"name": "", "key": None, "roots": {}}
+            return
+        
+        entry = {"name": proc_name.lower(), "key": (pid, create_time), "roots": {}}
+        self.processes[pid] = entry
+        self._assign(pid, entry)
+        
+        if self.bound and pid not in self.bound:
+            parent = self.bound.get(self._ppid(pid))
+            if parent:
+                self.bound[pid] = (parent[0], create_time)
+    
+    def _ppid(self, pid):
+        
+        try:
+            return self.source.ppid(pid)
+        except psutil.Error:
+            return None
+    
+    def _attribute(self, entry, attr):
+        """Fetches exe/cmdline on demand, cached by (pid, create_time)."""
+        cached = self.attributes.setdefault(entry["key"], {})
+        if attr not in cached:
+            try:
+                value = self.source.attribute(entry["key"][0], attr)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, OSError):
+                value = None
+            if attr == "cmdline":
+                cached[attr] = " ".join(value or [])
+            else:
+                cached[attr] = (value or "").lower()
+        return cached[attr]
+    
+    def _assign(self, pid, entry):
+        
+        proc_name = entry["name"]
+        apps = ()
+        if proc_name:
+            apps = self._matcher.match(proc_name, lambda attr: self._attribute(entry, attr))
+        
+        entry["roots"] = {}
+        if not apps:
+            return
+        
+
+        parent = self.processes.get(self._ppid(pid))
+        parent_roots = parent["roots"] if parent else {}
+        for app_name in apps:
+            root = parent_roots.get(app_name, pid)
+            entry["roots"][app_name] = root
+            self.app_instances.setdefault(app_name, {}).setdefault(root, set()).add(pid)
+    
+    def _forget(self, pid):
+        
+        entry = self.processes.pop(pid, None)
+        if not entry:
+            return
+        self.attributes.pop(entry["key"], None)
+        self.bound.pop(pid, None)
+        self.source.forget(pid)
+        for app_name, root in entry["roots"].items():
+            instances = self.app_instances.get(app_name)
+            if not instances or root not in instances:
+                continue
+            instances[root].discard(pid)
+            if not instances[root]:
+                del instances[root]
+                if not instances:
+                    del self.app_instances[app_name]
+    
+    def _rematch(self, matcher):
+        
+        self._matcher = matcher
+        self.app_instances = {}
+        for pid in sorted(self.processes):
+            self._assign(pid, self.processes[pid])
+
+class AdaptivePollScheduler:
+    """Interval between full tracker scans: short right after activity, backing off to `max_interval` while nothing changes."""
+    def __init__(self, min_interval=1.0, max_interval=3.0, backoff=1.5, battery_factor=2.0):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.backoff = backoff
+        self.battery_factor = battery_factor
+        self.interval = min_interval
+        self._wakeup = threading.Event()
+        self._battery_checked_at = 0
+        self._on_battery = False
+    
+    def poke(self):
+        """Asks for an immediate poll, then fast polling again."""
+        self.interval = self.min_interval
+        self._wakeup.set()
+    
+    def record_scan(self, changed):
+        
+        if changed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+    
+    def on_battery(self):
+        
+        now = time.monotonic()
+        if now - self._battery_checked_at >= 60:
+            self._battery_checked_at = now
+            try:
+                battery = psutil.sensors_battery()
+                self._on_battery = battery is not None and not battery.power_plugged
+            except (AttributeError, NotImplementedError, OSError):
+                self._on_battery = False
+        return self._on_battery
+    
+    def next_interval(self):
+        
+        if self.on_battery():
+            return min(self.interval * self.battery_factor, self.max_interval)
+        return self.interval
+    
+    def wait(self, timeout=None, check=None):
+        """Sleeps until the next scan; check() runs every min_interval meanwhile and ends the wait when it returns False."""
+        deadline = time.monotonic() + (self.next_interval() if timeout is None else timeout)
+        while not self._wakeup.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            if check is None:
+                self._wakeup.wait(remaining)
+            elif not self._wakeup.wait(min(remaining, self.min_interval)) and not check():
+                break
+        self._wakeup.clear()
+
+
+class ActivityJournal:
+    """Append-only JSON-lines log of activity events, folded into the store on compaction."""
+    def __init__(self, path, compact_every=500):
+        self.path = path
+        self.compact_every = compact_every
+        self.pending = 0
+        self.generation = self._read_generation()
+    
+    def _read_generation(self):
+        
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                header = json.loads(f.readline())
+        except (OSError, ValueError):
+            return 0
+        return header.get("id", 0) if header.get("type") == "generation" else 0
+    
+    def append(self, event):
+        """Appends one event; returns True once a compaction is due."""
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(event, separators=(",", ":")) + "\n")
+        self.pending += 1
+        return self.pending >= self.compact_every
+    
+    def replay(self):
+        
+        self.pending = 0
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("type") == "generation":
+                    continue
+                self.pending += 1
+                yield event
+    
+    def truncate(self):
+        """Empties the journal and starts its next generation."""
+        self.generation += 1
+        tmp_file = self.path + ".tmp"
+        with open(tmp_file, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"type": "generation", "id": self.generation}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.path)
+        self.pending = 0
+
+
+def write_json_atomic(path, data, **options):
+    """Writes JSON to a temp file, fsyncs it and renames it over `path`."""
+    write_text_atomic(path, json.dumps(data, **options))
+
+
+def write_text_atomic(path, text):
+    
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_file, path)
+
+
+class PersistenceService:
+    """Write-behind saving of the JSON configuration files, serialized by the caller and written by a worker thread."""
+    def __init__(self, delay=1.0):
+        self.delay = delay
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+    
+    def mark_dirty(self, path, data, **options):
+        """Serializes data now, on the calling thread, and schedules its write."""
+        text = json.dumps(data, **options)
+        with self._lock:
+            self._dirty[path] = text
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        self._wake.set()
+    
+    def _run(self):
+        
+        while True:
+            self._wake.wait()
+            time.sleep(self.delay)
+            self._wake.clear()
+            self.flush()
+    
+    def flush(self):
+        """Writes every dirty file now, after any write in flight; called when XClient quits."""
+        with self._write_lock:
+            with self._lock:
+                pending, self._dirty = self._dirty, {}
+            for path, text in pending.items():
+                try:
+                    write_text_atomic(path, text)
+                except Exception as e:
+                    print(f"Error saving {path}: {e}")
+
+RECENT_HISTORY_DAYS = 31
+
+
+def split_by_day(start, end):
+    """Yields (YYYY-MM-DD, seconds) for each local calendar day an epoch span covers."""
+    day = datetime.fromtimestamp(start).date()
+    while True:
+        next_midnight = datetime.combine(day + timedelta(days=1), datetime.min.time()).timestamp()
+        yield day.isoformat(), min(end, next_midnight) - start
+        if end <= next_midnight:
+            return
+        start = next_midnight
+        day += timedelta(days=1)
+
+
+def add_daily_session(daily, start, end):
+    """Adds a session to a {"YYYY-MM-DD": [seconds, sessions, launches]} rollup.
+
+    The session is counted on the day it started; its time is split at midnight.
+    """
+    # entries are replaced rather than modified, as published snapshots share them
+    first = True
+    for day, seconds in split_by_day(start, end):
+        total, sessions, launches = daily.get(day, (0, 0, 0))
+        daily[day] = [total + seconds, sessions + (1 if first else 0), launches]
+        first = False
+
+
+def add_daily_launch(daily, day, count=1):
+    
+    if count:
+        total, sessions, launches = daily.get(day, (0, 0, 0))
+        daily[day] = [total, sessions, launches + count]
+
+
+class SessionStore:
+    """Session history as per-app array('d') columns sorted by start, with prefix sums in `spans`."""
+    
+    def __init__(self):
+        self.columns = {}
+        self.spans = {}
+        self._lock = threading.Lock()
+    
+    def append(self, app_name, start, end, duration):
+        
+        with self._lock:
+            starts, ends, durations = self.columns.setdefault(app_name, (array("d"), array("d"), array("d")))
+            if not starts or start >= starts[-1]:
+                starts.append(start)
+                ends.append(end)
+                durations.append(duration)
+                spans = self.spans.setdefault(app_name, array("d", [0.0]))
+                spans.append(spans[-1] + end - start)
+            else:
+                index = bisect_right(starts, start)
+                starts.insert(index, start)
+                ends.insert(index, end)
+                durations.insert(index, duration)
+                self._index(app_name)
+    
+    def _index(self, app_name):
+        """Rebuilds the prefix sums of an app's session lengths; the lock must be held."""
+        columns = self.columns.get(app_name)
+        if not columns:
+            self.spans.pop(app_name, None)
+            return
+        spans = array("d", [0.0])
+        for start, end in zip(columns[0], columns[1]):
+            spans.append(spans[-1] + end - start)
+        self.spans[app_name] = spans
+    
+    def extend(self, app_name, sessions):
+        """Adds (start, end, duration) tuples in any order."""
+        for start, end, duration in sorted(sessions):
+            self.append(app_name, start, end, duration)
+    
+    def prepend(self, app_name, sessions):
+        """Adds (start, end, duration) tuples that all start before the stored ones."""
+        rows = sorted(sessions)
+        older = (array("d", [r[0] for r in rows]), array("d", [r[1] for r in rows]), array("d", [r[2] for r in rows]))
+        with self._lock:
+            current = self.columns.get(app_name)
+            if current:
+                older = tuple(old + new for old, new in zip(older, current))
+            self.columns[app_name] = older
+            self._index(app_name)
+    
+    def remove(self, app_name):
+        
+        with self._lock:
+            self.columns.pop(app_name, None)
+            self.spans.pop(app_name, None)
+    
+    def take_before(self, cutoff):
+        """Removes and returns (app name, start, end) for sessions started before cutoff (epoch)."""
+        taken = []
+        with self._lock:
+            for app_name, (starts, ends, durations) in list(self.columns.items()):
+                index = bisect_left(starts, cutoff)
+                if not index:
+                    continue
+                taken.extend((app_name, starts[i], ends[i]) for i in range(index))
+                if index == len(starts):
+                    del self.columns[app_name]
+                else:
+                    for column in (starts, ends, durations):
+                        del column[:index]
+                self._index(app_name)
+        return taken
+    
+    def prune(self, before):
+        """Drops sessions that ended before `before` (epoch) and returns how many."""
+        removed = 0
+        with self._lock:
+            for app_name, columns in list(self.columns.items()):
+                # sessions of one app never overlap, so ends are sorted too
+                index = bisect_right(columns[1], before)
+                if index == len(columns[0]):
+                    del self.columns[app_name]
+                elif index:
+                    for column in columns:
+                        del column[:index]
+                if index:
+                    self._index(app_name)
+                removed += index
+        return removed
+    
+    def sessions(self, app_name):
+        """Yields (start, end, duration) tuples in start order."""
+        columns = self.columns.get(app_name)
+        if columns:
+            yield from zip(*columns)
+    
+    def overlap_totals(self, begin, end):
+        """Returns {app: (seconds, sessions)} for the epoch range [begin, end).
+
+        Time is clipped to the range and sessions are counted where they
+        start. An app never has two sessions at once, so only the session
+        just before `begin` can straddle it.
+        """
+        totals = {}
+        with self._lock:
+            for app_name, (starts, ends, _) in self.columns.items():
+                spans = self.spans[app_name]
+                low = bisect_left(starts, begin)
+                high = bisect_left(starts, end)
+                # whole sessions from the prefix sums, then clip the one that may run past `end`
+                seconds = spans[high] - spans[low]
+                if high > low and ends[high - 1] > end:
+                    seconds -= ends[high - 1] - end
+                if low and ends[low - 1] > begin:
+                    seconds += min(ends[low - 1], end) - begin
+                if seconds or high > low:
+                    totals[app_name] = (seconds, high - low)
+        return totals
+
+
+ARCHIVE_RECORD = np.dtype([("app", "<i8"), ("start", "<f8"), ("end", "<f8")])
+
+
+class SessionArchive:
+    """Sealed months of sessions as fixed-width binary records, queried through NumPy memory maps."""
+    
+    def __init__(self, directory):
+        self.directory = directory
+        self.names = []
+        self.month_ends = {}
+        index_file = os.path.join(directory, "index.json")
+        if os.path.exists(index_file):
+            try:
+                with open(index_file, "r") as f:
+                    index = json.load(f)
+                self.names = index.get("apps", [])
+                self.month_ends = index.get("months", {})
+            except Exception as e:
+                print(f"Error loading activities: {e}")
+        self.ids = {name: app_id for app_id, name in enumerate(self.names)}
+    
+    def _path(self, month):
+        
+        return os.path.join(self.directory, f"{month}.bin")
+    
+    def _load(self, month):
+        
+        if month not in self.month_ends:
+            return np.zeros(0, dtype=ARCHIVE_RECORD)
+        return np.fromfile(self._path(month), dtype=ARCHIVE_RECORD)
+    
+    def _store(self, month, records):
+        
+        path = self._path(month)
+        if len(records):
+            tmp_file = path + ".tmp"
+            with open(tmp_file, "wb") as f:
+                records.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, path)
+            self.month_ends[month] = float(records["end"].max())
+        else:
+            if os.path.exists(path):
+                os.remove(path)
+            self.month_ends.pop(month, None)
+    
+    def _save_index(self):
+        
+        write_json_atomic(os.path.join(self.directory, "index.json"),
+                          {"apps": self.names, "months": self.month_ends})
+    
+    def seal(self, sessions):
+        """Archives (app name, start, end) tuples, merging them into existing months."""
+        by_month = {}
+        for app_name, start, end in sessions:
+            if app_name not in self.ids:
+                self.ids[app_name] = len(self.names)
+                self.names.append(app_name)
+            month = datetime.fromtimestamp(start).strftime("%Y-%m")
+            by_month.setdefault(month, []).append((self.ids[app_name], start, end))
+        if not by_month:
+            return 0
+        
+        os.makedirs(self.directory, exist_ok=True)
+        for month, rows in by_month.items():
+            # unique: sessions sealed again after an interrupted compaction are not doubled
+            records = np.unique(np.concatenate([self._load(month), np.array(rows, dtype=ARCHIVE_RECORD)]))
+            records.sort(order="start", kind="stable")
+            self._store(month, records)
+        self._save_index()
+        return sum(len(rows) for rows in by_month.values())
+    
+    def _rewrite(self, keep):
+        """Rewrites every month through keep(records) -> boolean mask; returns rows dropped."""
+        removed = 0
+        for month in list(self.month_ends):
+            records = self._load(month)
+            mask = keep(records)
+            if not mask.all():
+                removed += int((~mask).sum())
+                self._store(month, records[mask])
+        if removed:
+            self._save_index()
+        return removed
+    
+    def remove(self, app_name):
+        
+        if app_name in self.ids:
+            app_id = self.ids[app_name]
+            self._rewrite(lambda records: records["app"] != app_id)
+    
+    def prune(self, before):
+        """Drops archived sessions that ended before `before` (epoch)."""
+        return self._rewrite(lambda records: records["end"] >= before)
+    
+    def rows(self):
+        """Yields every archived (app name, start, end) tuple."""
+        for month in sorted(self.month_ends):
+            for app_id, start, end in self._load(month).tolist():
+                yield self.names[app_id], start, end
+    
+    def overlap_totals(self, begin, end):
+        """Same contract as SessionStore.overlap_totals, over the sealed months."""
+        totals = {}
+        for month, month_end in list(self.month_ends.items()):
+            if month_end <= begin or datetime.strptime(month, "%Y-%m").timestamp() >= end:
+                continue
+            try:
+                records = np.memmap(self._path(month), dtype=ARCHIVE_RECORD, mode="r")
+            except FileNotFoundError:
+                continue
+            starts, ends = records["start"], records["end"]
+            # sorted by start: only records before `end` can overlap
+            upper = int(np.searchsorted(starts, end, side="left"))
+            mask = ends[:upper] > begin
+            apps = records["app"][:upper][mask]
+            if len(apps):
+                seconds = np.bincount(apps, weights=np.minimum(ends[:upper][mask], end)
+                                      - np.maximum(starts[:upper][mask], begin))
+                started = np.bincount(apps, weights=starts[:upper][mask] >= begin)
+                for app_id in np.flatnonzero(np.bincount(apps)):
+                    app_seconds, app_sessions = totals.get(self.names[app_id], (0, 0))
+                    totals[self.names[app_id]] = (app_seconds + float(seconds[app_id]),
+                                                  app_sessions + int(started[app_id]))
+            # starts and ends are views that keep the file mapped
+            del records, starts, ends
+        return totals
+
+
+class JsonActivityStore:
+    """Default storage: activity_data/index.json plus one JSON shard per month, and a journal."""
+    history_days = RECENT_HISTORY_DAYS
+    
+    def __init__(self, activity_file):
+        self.activity_file = activity_file
+        self.directory = os.path.splitext(activity_file)[0]
+        self.journal = ActivityJournal(os.path.join(os.path.dirname(activity_file), "activity_journal.jsonl"))
+        self.archive = SessionArchive(os.path.join(os.path.dirname(activity_file), "activity_archive"))
+        self.activities = {}
+        self.sessions = SessionStore()
+        self.month_totals = {}
+        self.loaded_months = set()
+        self.dirty_months = set()
+        self.removed_apps = set()
+        self.deferred = {}
+        self.history_progress = None
+        self._history_lock = threading.Lock()
+        self._history_thread = None
+    
+    @property
+    def history_loaded(self):
+        
+        return not self.deferred
+    
+    @staticmethod
+    def _parse_session(session):
+        
+        return (datetime.fromisoformat(session["start"]).timestamp(),
+                datetime.fromisoformat(session["end"]).timestamp(),
+                session.get("duration", 0))
+    
+    def _shard_path(self, month):
+        
+        return os.path.join(self.directory, f"{month}.json")
+    
+    def _read_shard(self, month):
+        
+        path = self._shard_path(month)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r") as f:
+            return json.load(f)
+    
+    def load(self):
+        
+        data = {}
+        self.sessions = SessionStore()
+        self.deferred = {}
+        now = datetime.now()
+        self.loaded_months = {(now - timedelta(days=days)).strftime("%Y-%m") for days in range(self.history_days + 1)}
+        index_file = os.path.join(self.directory, "index.json")
+        try:
+            if os.path.exists(index_file):
+                with open(index_file, "r") as f:
+                    index = json.load(f)
+                self._finish_compaction(index.get("journal") == self.journal.generation)
+                data = {app_name: dict(totals, daily={}) for app_name, totals in index.get("apps", {}).items()}
+                self.month_totals = index.get("months", {})
+                self.loaded_months |= set(index.get("live", []))
+                for month in sorted(self.loaded_months):
+                    self._load_shard(data, month)
+            else:
+                self._finish_compaction(False)
+                if os.path.exists(self.activity_file):
+                    data = self._load_single_file()
+        except Exception as e:
+            print(f"Error loading activities: {e}")
+            data = {}
+            self.sessions = SessionStore()
+            self.deferred = {}
+        
+        self.activities = data
+        try:
+            for event in self.journal.replay():
+                self.apply_event(event)
+        except Exception as e:
+            print(f"Error loading activities: {e}")
+        return data
+    
+    def _finish_compaction(self, committed):
+        """Installs or discards the shards of a compaction interrupted before it emptied the journal."""
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else ():
+            if name.endswith(".json.new"):
+                path = os.path.join(self.directory, name)
+                if committed:
+                    os.replace(path, path[:-len(".new")])
+                else:
+                    os.remove(path)
+        if committed:
+            self.journal.truncate()
+    
+    def _load_shard(self, data, month):
+        
+        shard = self._read_shard(month)
+        for app_name, days in shard.get("daily", {}).items():
+            app_data = data.setdefault(app_name, {"total_time": 0, "launch_count": 0, "last_used": "", "daily": {}})
+            app_data.setdefault("daily", {}).update(days)
+        for app_name, sessions in shard.get("sessions", {}).items():
+            self.sessions.extend(app_name, [self._parse_session(s) for s in sessions])
+        self.loaded_months.add(month)
+    
+    def load_all_months(self):
+        """Loads every shard into `activities`; used to export the full history."""
+        for month in sorted(set(self.month_totals) - self.loaded_months):
+            self._load_shard(self.activities, month)
+        return self.activities
+    
+    def _load_single_file(self):
+        """Reads an activity_data.json written before the data was sharded."""
+        with open(self.activity_file, "r") as f:
+            data = json.load(f)
+
+        # ISO strings sort like the dates they hold, so the window is
+        # split without parsing a single datetime
+        cutoff = (datetime.now() - timedelta(days=self.history_days)).isoformat()
+        for app_name, app_data in data.items():
+            recent, older = [], []
+            for session in app_data.pop("sessions", []):
+                if "start" in session and "end" in session:
+                    (recent if session["start"] >= cutoff else older).append(session)
+            rows = [self._parse_session(s) for s in recent]
+            self.sessions.extend(app_name, rows)
+            if older:
+                self.deferred[app_name] = older
+            if "daily" not in app_data:
+                app_data["daily"] = self._build_daily(rows, older)
+            self.loaded_months |= {day[:7] for day in app_data["daily"]}
+        self.dirty_months |= self.loaded_months
+        return data
+    
+    def _build_daily(self, rows, older):
+        """Rebuilds the per-day rollup of a file written before rollups existed."""
+        daily = {}
+        rows = list(rows)
+        for session in older:
+            try:
+                rows.append(self._parse_session(session))
+            except (TypeError, ValueError):
+                pass
+        for start, end, _ in rows:
+            add_daily_session(daily, start, end)
+        return daily
+    
+    def load_history(self, wait=False):
+        """Parses the deferred sessions, on a background thread unless wait is set."""
+        with self._history_lock:
+            thread = self._history_thread
+            if not self.deferred or (thread and not wait):
+                return
+            self.history_progress = 0.0
+            if not wait:
+                self._history_thread = threading.Thread(target=self._load_history, daemon=True)
+                self._history_thread.start()
+                return
+        if thread:
+            thread.join()
+        else:
+            self._load_history()
+    
+    def _load_history(self):
+        
+        pending = list(self.deferred.items())
+        total = sum(len(raw) for _, raw in pending) or 1
+        done = 0
+        for app_name, raw in pending:
+            rows = []
+            for session in raw:
+                try:
+                    rows.append(self._parse_session(session))
+                except (TypeError, ValueError):
+                    pass
+            with self._history_lock:
+                if self.deferred.get(app_name) is raw:
+                    self.sessions.prepend(app_name, rows)
+                    del self.deferred[app_name]
+            done += len(raw)
+            self.history_progress = done / total
+        with self._history_lock:
+            self._history_thread = None
+    
+    def _touch(self, event):
+        """Marks the months an event changes, so the next compaction rewrites their shards."""
+        if event.get("type") == "launch":
+            months = {event["at"][:7]}
+        elif event.get("type") == "session":
+            start = datetime.fromisoformat(event["start"]).timestamp()
+            end = datetime.fromisoformat(event["end"]).timestamp()
+            months = {day[:7] for day, _ in split_by_day(start, end)}
+        else:
+            months = set(self.loaded_months)
+        self.loaded_months |= months
+        self.dirty_months |= months
+    
+    def apply_event(self, event):
+        
+        app_name = event.get("app")
+        self._touch(event)
+        if event.get("type") == "remove":
+            self.activities.pop(app_name, None)
+            self._remove_sessions(app_name)
+            return
+        
+        app_data = self.activities.setdefault(app_name, {
+            "total_time": 0,
+            "launch_count": 0,
+            "last_used": "",
+            "daily": {}
+        })
+        daily = app_data.setdefault("daily", {})
+        if event.get("type") == "launch":
+            app_data["launch_count"] += event.get("count", 1)
+            app_data["last_used"] = event["at"]
+            add_daily_launch(daily, event["at"][:10], event.get("count", 1))
+        elif event.get("type") == "session":
+            app_data["total_time"] += event["duration"]
+            start, end = self._add_session(event)
+            add_daily_session(daily, start, end)
+    
+    def _add_session(self, event):
+        
+        start = datetime.fromisoformat(event["start"]).timestamp()
+        end = datetime.fromisoformat(event["end"]).timestamp()
+        self.sessions.append(event["app"], start, end, event["duration"])
+        return start, end
+    
+    def _remove_sessions(self, app_name):
+        
+        with self._history_lock:
+            self.deferred.pop(app_name, None)
+            self.sessions.remove(app_name)
+            self.archive.remove(app_name)
+            self.removed_apps.add(app_name)
+    
+    def prune(self, before_date):
+        """Drops raw sessions that ended before before_date. Rollups keep their totals."""
+        before = before_date.isoformat()
+        removed = 0
+        with self._history_lock:
+            for app_name, raw in list(self.deferred.items()):
+                kept = [s for s in raw if s.get("end", "") >= before]
+                removed += len(raw) - len(kept)
+                if kept:
+                    self.deferred[app_name] = kept
+                else:
+                    del self.deferred[app_name]
+            live_removed = self.sessions.prune(before_date.timestamp())
+            if live_removed:
+                self.dirty_months |= self.loaded_months
+            removed += live_removed + self.archive.prune(before_date.timestamp())
+        return removed
+    
+    def apply(self, event):
+        
+        self._touch(event)
+        if event.get("type") == "session":
+            self._add_session(event)
+        elif event.get("type") == "remove":
+            self._remove_sessions(event.get("app"))
+        return self.journal.append(event)
+    
+    def _seal_past_months(self):
+        """Moves the sessions of past months from the live store to the archive."""
+        self.load_history(wait=True)
+        month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        with self._history_lock:
+            sessions = self.sessions.take_before(month_start.timestamp())
+            self.archive.seal(sessions)
+            self.dirty_months |= {datetime.fromtimestamp(start).strftime("%Y-%m") for _, start, _ in sessions}
+    
+    def compact(self, activities):
+        """Rewrites the index and the changed shards, then empties the journal."""
+        self._seal_past_months()
+        with self._history_lock:
+            dirty, self.dirty_months = self.dirty_months, set()
+            removed, self.removed_apps = self.removed_apps, set()
+        
+        shards = {month: {"daily": {}, "sessions": {}} for month in dirty}
+        for app_name, app_data in activities.items():
+            for day, entry in app_data.get("daily", {}).items():
+                if day[:7] in shards:
+                    shards[day[:7]]["daily"].setdefault(app_name, {})[day] = entry
+            for start, end, duration in self.sessions.sessions(app_name):
+                session_start = datetime.fromtimestamp(start)
+                month = session_start.strftime("%Y-%m")
+                if month in shards:
+                    shards[month]["sessions"].setdefault(app_name, []).append({
+                        "start": session_start.isoformat(),
+                        "end": datetime.fromtimestamp(end).isoformat(),
+                        "duration": duration
+                    })
+        
+        os.makedirs(self.directory, exist_ok=True)
+        for month, shard in shards.items():
+            self.month_totals[month] = {
+                app_name: [sum(entry[i] for entry in days.values()) for i in range(3)]
+                for app_name, days in shard["daily"].items()
+            }
+            write_json_atomic(self._shard_path(month) + ".new", shard)
+        
+        for month in sorted(set(self.month_totals) - self.loaded_months):
+            if removed & set(self.month_totals[month]):
+                shard = self._read_shard(month)
+                for app_name in removed:
+                    shard.get("daily", {}).pop(app_name, None)
+                    shard.get("sessions", {}).pop(app_name, None)
+                self.month_totals[month] = {app_name: entry for app_name, entry in self.month_totals[month].items()
+                                            if app_name not in removed}
+                write_json_atomic(self._shard_path(month) + ".new", shard)
+        
+        # index.json commits the compaction: its journal generation tells load()
+        # whether the staged shards and the journal are already folded in
+        
+        live_months = sorted({datetime.fromtimestamp(start).strftime("%Y-%m")
+                              for app_name in activities for start, _, _ in self.sessions.sessions(app_name)})
+        write_json_atomic(os.path.join(self.directory, "index.json"), {
+            "apps": {
+                app_name: {
+                    "total_time": app_data.get("total_time", 0),
+                    "launch_count": app_data.get("launch_count", 0),
+                    "last_used": app_data.get("last_used", "")
+                }
+                for app_name, app_data in activities.items()
+            },
+            "months": self.month_totals,
+            "live": live_months,
+            "journal": self.journal.generation
+        })
+        if os.path.exists(self.activity_file):
+            os.replace(self.activity_file, self.activity_file + ".bak")
+        self._finish_compaction(True)
+    
+    def older_totals(self, first_day):
+        """Returns {app: (seconds, sessions)} from first_day (YYYY-MM-DD) on, for months not in memory."""
+        first_month = first_day[:7]
+        totals = {}
+        for month, apps in list(self.month_totals.items()):
+            if month in self.loaded_months or month < first_month:
+                continue
+            if month == first_month:
+                rows = {
+                    app_name: [sum(entry[i] for day, entry in days.items() if day >= first_day) for i in range(2)]
+                    for app_name, days in self._read_shard(month).get("daily", {}).items()
+                }
+            else:
+                rows = apps
+            for app_name, entry in rows.items():
+                seconds, sessions = totals.get(app_name, (0, 0))
+                totals[app_name] = (seconds + entry[0], sessions + entry[1])
+        return totals
+    
+    def overlap_totals(self, begin_date, end_date):
+        
+        begin, end = begin_date.timestamp(), end_date.timestamp()
+        # the tracker thread replaces and removes archive files under this lock,
+        # which fails on Windows while a query has them mapped
+        with self._history_lock:
+            totals = self.sessions.overlap_totals(begin, end)
+            archived = self.archive.overlap_totals(begin, end)
+        for app_name, (seconds, sessions) in archived.items():
+            live_seconds, live_sessions = totals.get(app_name, (0, 0))
+            totals[app_name] = (live_seconds + seconds, live_sessions + sessions)
+        return totals
+
+
+class SqliteActivityStore:
+    """Optional SQLite storage: session rows stay on disk, the daily rollups are loaded into memory."""
+    history_loaded = True
+    history_progress = None
+    
+    def __init__(self, db_file, activity_file):
+        self.db_file = db_file
+        self.activity_file = activity_file
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_file, check_same_thread=False)
+        self._conn.executescript("""
+            CREATE TABLE IF NOT EXISTS apps (
+                name TEXT PRIMARY KEY,
+                total_time REAL NOT NULL DEFAULT 0,
+                launch_count INTEGER NOT NULL DEFAULT 0,
+                last_used TEXT NOT NULL DEFAULT ''
+            );
+            CREATE TABLE IF NOT EXISTS sessions (
+                app TEXT NOT NULL,
+                start REAL NOT NULL,
+                end REAL NOT NULL,
+                duration REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS sessions_app_start ON sessions (app, start);
+            CREATE INDEX IF NOT EXISTS sessions_start ON sessions (start);
+            CREATE TABLE IF NOT EXISTS launches (
+                app TEXT NOT NULL,
+                at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS launches_app_at ON launches (app, at);
+            CREATE TABLE IF NOT EXISTS daily (
+                app TEXT NOT NULL,
+                day TEXT NOT NULL,
+                seconds REAL NOT NULL DEFAULT 0,
+                sessions INTEGER NOT NULL DEFAULT 0,
+                launches INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (app, day)
+            );
+        """)
+    
+    def load(self):
+        
+        with self._lock:
+            version = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if not version:
+            self.import_json()
+        elif version < 2:
+            self._build_daily()
+        
+        with self._lock:
+            rows = self._conn.execute("SELECT name, total_time, launch_count, last_used FROM apps").fetchall()
+            daily_rows = self._conn.execute("SELECT app, day, seconds, sessions, launches FROM daily").fetchall()
+        activities = {
+            name: {"total_time": total_time, "launch_count": launch_count, "last_used": last_used, "daily": {}}
+            for name, total_time, launch_count, last_used in rows
+        }
+        for app_name, day, seconds, sessions, launches in daily_rows:
+            if app_name in activities:
+                activities[app_name]["daily"][day] = [seconds, sessions, launches]
+        return activities
+    
+    def _build_daily(self):
+        """Fills the daily table of a database created before it existed."""
+        with self._lock, self._conn:
+            rollups = {}
+            for app_name, start, end in self._conn.execute("SELECT app, start, end FROM sessions"):
+                add_daily_session(rollups.setdefault(app_name, {}), start, end)
+            for app_name, at in self._conn.execute("SELECT app, at FROM launches"):
+                add_daily_launch(rollups.setdefault(app_name, {}), datetime.fromtimestamp(at).date().isoformat())
+            self._insert_daily(rollups)
+            self._conn.execute("PRAGMA user_version = 2")
+    
+    def _insert_daily(self, rollups):
+        
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO daily (app, day, seconds, sessions, launches) VALUES (?, ?, ?, ?, ?)",
+            [(app_name, day, *entry) for app_name, daily in rollups.items() for day, entry in daily.items()])
+    
+    def _add_daily(self, app_name, day, seconds=0, sessions=0, launches=0):
+        
+        self._conn.execute(
+            "INSERT INTO daily (app, day, seconds, sessions, launches) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (app, day) DO UPDATE SET seconds = seconds + excluded.seconds, "
+            "sessions = sessions + excluded.sessions, launches = launches + excluded.launches",
+            (app_name, day, seconds, sessions, launches))
+    
+    def import_json(self):
+        """One-shot import of the JSON activity data and its journal."""
+        source = JsonActivityStore(self.activity_file)
+        sources = (self.activity_file, source.journal.path, os.path.join(source.directory, "index.json"))
+        activities = source.load() if any(os.path.exists(path) for path in sources) else {}
+        source.load_history(wait=True)
+        source.load_all_months()
+        session_count = 0
+        with self._lock, self._conn:
+            for app_name, app_data in activities.items():
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO apps (name, total_time, launch_count, last_used) VALUES (?, ?, ?, ?)",
+                    (app_name, app_data.get("total_time", 0), app_data.get("launch_count", 0),
+                     app_data.get("last_used", "")))
+                rows = [(app_name, start, end, duration)
+                        for start, end, duration in source.sessions.sessions(app_name)]
+                self._conn.executemany("INSERT INTO sessions (app, start, end, duration) VALUES (?, ?, ?, ?)", rows)
+                session_count += len(rows)
+            rows = [(app_name, start, end, end - start) for app_name, start, end in source.archive.rows()]
+            self._conn.executemany("INSERT INTO sessions (app, start, end, duration) VALUES (?, ?, ?, ?)", rows)
+            session_count += len(rows)
+            self._insert_daily({app_name: app_data.get("daily", {}) for app_name, app_data in activities.items()})
+            self._conn.execute("PRAGMA user_version = 2")
+        if activities:
+            print(f"[Tracker] Imported {session_count} sessions from {self.activity_file}")
+    
+    def apply(self, event):
+        
+        app_name = event.get("app")
+        with self._lock, self._conn:
+            if event.get("type") == "remove":
+                for table, column in (("apps", "name"), ("sessions", "app"), ("launches", "app"), ("daily", "app")):
+                    self._conn.execute(f"DELETE FROM {table} WHERE {column} = ?", (app_name,))
+                return
+            
+            self._conn.execute("INSERT OR IGNORE INTO apps (name) VALUES (?)", (app_name,))
+            if event.get("type") == "launch":
+                count = event.get("count", 1)
+                self._conn.execute("UPDATE apps SET launch_count = launch_count + ?, last_used = ? WHERE name = ?",
+                                   (count, event["at"], app_name))
+                if count:
+                    self._conn.execute("INSERT INTO launches (app, at) VALUES (?, ?)",
+                                       (app_name, datetime.fromisoformat(event["at"]).timestamp()))
+                    self._add_daily(app_name, event["at"][:10], launches=count)
+            elif event.get("type") == "session":
+                start = datetime.fromisoformat(event["start"]).timestamp()
+                end = datetime.fromisoformat(event["end"]).timestamp()
+                self._conn.execute("UPDATE apps SET total_time = total_time + ? WHERE name = ?",
+                                   (event["duration"], app_name))
+                self._conn.execute("INSERT INTO sessions (app, start, end, duration) VALUES (?, ?, ?, ?)",
+                                   (app_name, start, end, event["duration"]))
+                for index, (day, seconds) in enumerate(split_by_day(start, end)):
+                    self._add_daily(app_name, day, seconds=seconds, sessions=1 if index == 0 else 0)
+    
+    def load_history(self, wait=False):
+        
+        pass
+    
+    def prune(self, before_date):
+        
+        before = before_date.timestamp()
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM sessions WHERE end < ?", (before,)).rowcount
+            self._conn.execute("DELETE FROM launches WHERE at < ?", (before,))
+        if removed:
+            with self._lock:
+                self._conn.execute("VACUUM")
+        return removed
+    
+    def compact(self, activities):
+        
+        with self._lock:
+            self._conn.commit()
+    
+    def older_totals(self, first_day):
+        """Every rollup is in memory: nothing to add."""
+        return {}
+    
+    def overlap_totals(self, begin_date, end_date):
+        
+        begin, end = begin_date.timestamp(), end_date.timestamp()
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT app, SUM(MIN(end, :end) - MAX(start, :begin)), SUM(start >= :begin)
+                FROM sessions
+                WHERE end > :begin AND rowid IN (
+                    SELECT rowid FROM sessions WHERE start >= :begin AND start < :end
+                    UNION
+                    SELECT (SELECT rowid FROM sessions WHERE app = apps.name AND start < :begin
+                            ORDER BY start DESC LIMIT 1) FROM apps
+                )
+                GROUP BY app
+            """, {"begin": begin, "end": end}).fetchall()
+        return {app_name: (seconds or 0, count) for app_name, seconds, count in rows}
+
+
+def create_activity_store(backend, activity_file):
+    
+    if backend == "sqlite":
+        db_file = os.path.splitext(activity_file)[0] + ".db"
+        return SqliteActivityStore(db_file, activity_file)
+    return JsonActivityStore(activity_file)
+
+
+class ActivitySnapshot:
+    """Immutable view of the tracker's data at one version; its dicts are read-only."""
+    __slots__ = ("version", "data_version", "activities", "running_apps", "instances")
+    
+    def __init__(self, version, data_version, activities, running_apps, instances):
+        self.version = version
+        self.data_version = data_version
+        self.activities = MappingProxyType(activities)
+        self.running_apps = MappingProxyType(running_apps)
+        self.instances = MappingProxyType(instances)
+
+
+# calendar periods accepted by get_statistics besides a number of days
+CALENDAR_PERIODS = ("today", "week", "month")
+
+def calendar_period_start(period, now):
+    """Local midnight that starts the calendar period containing now."""
+    midnight = datetime.combine(now.date(), datetime.min.time())
+    if period == "week":
+        # ISO weeks start on Monday
+        return midnight - timedelta(days=now.weekday())
+    if period == "month":
+        return midnight.replace(day=1)
+    return midnight
+
+
+class StatsEngine:
+    """Period statistics of an ActivityTracker, computed together and cached per data version.
+
+    vectorize_from is a conservative margin over the NumPy crossover that `benchmark.py stats` measures.
+    """
+    PERIODS = ("today", "week", "month", 1, 7, 30, 36500)
+    
+    def __init__(self, tracker, max_age=60, vectorize_from=1000):
+        self.tracker = tracker
+        self.max_age = max_age
+        self.vectorize_from = vectorize_from
+        self._cache = None
+        self._export = {}
+        self._merged = {}
+    
+    def get(self, period_days):
+        
+        snapshot = self.tracker.snapshot()
+        now = self.tracker.clock()
+        key = (snapshot.data_version, self.tracker.store.history_loaded)
+        cache = self._cache
+        if cache is None or cache[0] != key or (now - cache[1]).total_seconds() >= self.max_age:
+            cache = (key, now, self._compute(snapshot, now, self.PERIODS))
+        if period_days not in cache[2]:
+            cache = (cache[0], cache[1], {**cache[2], **self._compute(snapshot, cache[1], (period_days,))})
+        self._cache = cache
+        stats = cache[2][period_days]
+        if snapshot.running_apps:
+            # one copy per cached result and set of running sessions; later calls
+            # only refresh the entries of the running apps
+            merged = self._merged.get(period_days)
+            if merged is None or merged[0] is not stats or merged[1] is not snapshot.running_apps:
+                merged = (stats, snapshot.running_apps, dict(stats))
+                self._merged[period_days] = merged
+            self._add_running(merged[2], stats, snapshot.running_apps, self.period_start(period_days, now), now)
+            stats = merged[2]
+        return stats
+    
+    @staticmethod
+    def period_start(period_days, now):
+        
+        if period_days in CALENDAR_PERIODS:
+            return calendar_period_start(period_days, now)
+        return now - timedelta(days=period_days)
+    
+    @staticmethod
+    def _add_running(merged, stats, running_apps, begin, now):
+        """Sets the running apps' entries of merged to their stats plus the elapsed session time."""
+        for app_name, start_time in running_apps.items():
+            if app_name not in stats:
+                continue
+            app_stats = dict(stats[app_name])
+            app_stats["total_time"] += max(0, (now - start_time).total_seconds())
+            app_stats["period_time"] += max(0, (now - max(start_time, begin)).total_seconds())
+            if start_time >= begin:
+                app_stats["period_launches"] += 1
+            if app_stats["period_launches"] > 0:
+                app_stats["avg_session_time"] = app_stats["period_time"] / app_stats["period_launches"]
+            merged[app_name] = app_stats
+    
+    def _compute(self, snapshot, now, periods):
+        
+        store = self.tracker.store
+        horizon = self.tracker.retention_horizon()
+        bounds = {}
+        for period_days in periods:
+            if period_days in CALENDAR_PERIODS:
+                begin = calendar_period_start(period_days, now)
+                if horizon is None or begin >= horizon:
+                    bounds[period_days] = (None, store.overlap_totals(begin, now), {})
+                    continue
+                cutoff_date = begin
+            else:
+                cutoff_date = now - timedelta(days=period_days)
+            next_midnight = datetime.combine(cutoff_date.date() + timedelta(days=1), datetime.min.time())
+            if horizon is not None and cutoff_date < horizon:
+                # raw sessions past the retention horizon may be gone: whole days only
+                first_full_day = cutoff_date.date().isoformat()
+                boundary_totals = {}
+            else:
+                # the cutoff day comes from the sessions, every later day from the rollups
+                first_full_day = next_midnight.date().isoformat()
+                boundary_totals = store.overlap_totals(cutoff_date, next_midnight)
+            # months whose rollups are not in memory are summed by the store
+            bounds[period_days] = (first_full_day, boundary_totals, store.older_totals(first_full_day))
+        
+        rollup_days = [(period_days, first_full_day) for period_days, (first_full_day, _, _) in bounds.items()
+                       if first_full_day is not None]
+        names = list(snapshot.activities)
+        if sum(len(app_data.get("daily", {})) for app_data in snapshot.activities.values()) >= self.vectorize_from:
+            rollups = self.rollup_totals_numpy(self._exported(snapshot.activities, names), rollup_days)
+        else:
+            rollups = self.rollup_totals_python(snapshot.activities, names, rollup_days)
+        
+        results = {period_days: {} for period_days in periods}
+        for index, app_name in enumerate(names):
+            app_data = snapshot.activities[app_name]
+            totals = {}
+            for period_days, (_, boundary_totals, older_totals) in bounds.items():
+                period_time, period_launches = boundary_totals.get(app_name, (0, 0))
+                older_time, older_launches = older_totals.get(app_name, (0, 0))
+                totals[period_days] = [period_time + older_time, period_launches + older_launches]
+            for period_days, (seconds, sessions) in rollups.items():
+                totals[period_days][0] += seconds[index]
+                totals[period_days][1] += sessions[index]
+            
+            for period_days, (period_time, period_launches) in totals.items():
+                results[period_days][app_name] = {
+                    "total_time": app_data.get("total_time", 0),
+                    "period_time": period_time,
+                    "total_launches": app_data.get("launch_count", 0),
+                    "period_launches": period_launches,
+                    "last_used": app_data.get("last_used", ""),
+                    "avg_session_time": period_time / period_launches if period_launches > 0 else 0
+                }
+        return results
+    
+    @staticmethod
+    def rollup_totals_python(activities, names, rollup_days):
+        """Sums the daily rollups of each app from each (period, first day) on.
+
+        Returns {period: (seconds, sessions)}, two lists aligned with names.
+        """
+        totals = {period_days: ([0] * len(names), [0] * len(names)) for period_days, _ in rollup_days}
+        for index, app_name in enumerate(names):
+            for day, (seconds, sessions, _) in activities[app_name].get("daily", {}).items():
+                for period_days, first_full_day in rollup_days:
+                    if day >= first_full_day:
+                        totals[period_days][0][index] += seconds
+                        totals[period_days][1][index] += sessions
+        return totals
+    
+    def _exported(self, activities, names):
+        """Rollup arrays of each app, exported again only for the apps whose daily dict was replaced."""
+        exported = {}
+        for app_name in names:
+            daily = activities[app_name].get("daily", {})
+            entry = self._export.get(app_name)
+            if entry is None or entry[0] is not daily:
+                entry = (daily, self.export_rollups(daily))
+            exported[app_name] = entry
+        self._export = exported
+        return [exported[app_name][1] for app_name in names]
+    
+    @staticmethod
+    def export_rollups(daily):
+        """Converts one app's daily rollup into (days, [seconds, sessions, launches] rows) arrays."""
+        days = np.array(list(daily), dtype="datetime64[D]")
+        return days, np.array(list(daily.values()), dtype=float).reshape(-1, 3)
+    
+    @staticmethod
+    def rollup_totals_numpy(exported, rollup_days):
+        """Same result as rollup_totals_python, from per-app export_rollups arrays, with masked bincounts."""
+        codes = np.repeat(np.arange(len(exported)), [len(days) for days, _ in exported])
+        days = np.concatenate([days for days, _ in exported]) if exported else np.zeros(0, dtype="datetime64[D]")
+        rows = np.concatenate([rows for _, rows in exported]) if exported else np.zeros((0, 3))
+        totals = {}
+        for period_days, first_full_day in rollup_days:
+            mask = days >= np.datetime64(first_full_day)
+            seconds = np.bincount(codes[mask], weights=rows[mask, 0], minlength=len(exported))
+            sessions = np.bincount(codes[mask], weights=rows[mask, 1], minlength=len(exported))
+            totals[period_days] = (seconds.tolist(), sessions.astype(np.int64).tolist())
+        return totals
+
 class ActivityTracker:
-    def __init__(self, app_manager):
+    def __init__(self, app_manager, process_source=None, max_poll_interval=3,
+                 clock=None, activity_file="activity_data.json", backend="json", retention_days=0):
         self.app_manager = app_manager
-        self.activity_file = "activity_data.json"
+        self.clock = clock or datetime.now
+        self.activity_file = activity_file
+        self.store = create_activity_store(backend, activity_file)
         self.activities = self.load_activities()
         self.running_apps = {}
+        self.version = 0
+        self.data_version = 0
+        self._instances = {}
+        self._snapshot = ActivitySnapshot(0, 0, self.activities, {}, self._instances)
+        self.stats = StatsEngine(self)
         self.tracking_thread = None
         self.tracking_active = False
+        self._matcher = None
+        self._matcher_signature = None
+        self.scanner = ProcessScanner(process_source)
+        self.scheduler = AdaptivePollScheduler(max_interval=max_poll_interval)
+        self._requests = deque()
+        self._pending_events = deque()
+        self.retention_days = retention_days
+        self._retention_day = None
         
     def load_activities(self):
         
-        if os.path.exists(self.activity_file):
+        return self.store.load()
+    
+    def _log(self, event):
+        """Queues an event; the tracker thread writes it on its next pass."""
+        self._pending_events.append(event)
+    
+    def _write_events(self):
+        
+        compaction_due = False
+        sessions_written = False
+        while self._pending_events:
+            event = self._pending_events.popleft()
             try:
-                with open(self.activity_file, "r") as f:
-                    data = json.load(f)
-
-                    for app_name, app_data in data.items():
-                        for session in app_data.get("sessions", []):
-                            if "start" in session:
-                                session["start"] = datetime.fromisoformat(session["start"])
-                            if "end" in session:
-                                session["end"] = datetime.fromisoformat(session["end"])
-                    return data
+                compaction_due = self.store.apply(event) or compaction_due
+                sessions_written = sessions_written or event.get("type") == "session"
             except Exception as e:
-                print(f"Error loading activities: {e}")
-                return {}
-        return {}
+                print(f"Error saving activities: {e}")
+        if sessions_written:
+            # calendar statistics read ended sessions from the store: publish a new data version
+            self._publish()
+        if compaction_due:
+            self.save_activities()
     
     def save_activities(self):
         
+        self._write_events()
         try:
-
-            data_to_save = {}
-            for app_name, app_data in self.activities.items():
-                data_to_save[app_name] = {
-                    "total_time": app_data.get("total_time", 0),
-                    "launch_count": app_data.get("launch_count", 0),
-                    "last_used": app_data.get("last_used", ""),
-                    "sessions": []
-                }
-                for session in app_data.get("sessions", []):
-                    session_copy = session.copy()
-                    if isinstance(session_copy.get("start"), datetime):
-                        session_copy["start"] = session_copy["start"].isoformat()
-                    if isinstance(session_copy.get("end"), datetime):
-                        session_copy["end"] = session_copy["end"].isoformat()
-                    data_to_save[app_name]["sessions"].append(session_copy)
-            
-            with open(self.activity_file, "w") as f:
-                json.dump(data_to_save, f, indent=2)
+            self.store.compact(self.activities)
         except Exception as e:
             print(f"Error saving activities: {e}")
     
@@ -80,116 +1844,175 @@ class ActivityTracker:
     def stop_tracking(self):
         
         self.tracking_active = False
+        self.scheduler.poke()
+        if self.tracking_thread and self.tracking_thread is not threading.current_thread():
+            self.tracking_thread.join(timeout=5)
 
+        self._handle_requests()
         for app_name in list(self.running_apps.keys()):
             self._record_session_end(app_name)
         self.save_activities()
     
+    def _get_matcher(self):
+        
+        signature = ProcessMatcher.signature(self.app_manager.applications)
+        if self._matcher is None or signature != self._matcher_signature:
+            self._matcher = ProcessMatcher(self.app_manager.applications)
+            self._matcher_signature = signature
+        return self._matcher
+    
+    def poll(self):
+        """Runs one detection pass; returns True if a session started or stopped."""
+        matcher = self._get_matcher()
+        changed = self._handle_requests()
+        app_instances = self.scanner.scan(matcher)
+        bound_apps = self.scanner.bound_apps()
+        
+
+        for app_name in app_instances:
+            if app_name not in self.running_apps:
+                self._record_session_start(app_name)
+                changed = True
+                print(f"[Tracker] Start detected: {app_name}")
+        
+        for app_name in list(self.running_apps.keys()):
+            if app_name not in app_instances and app_name not in bound_apps:
+                self._record_session_end(app_name)
+                changed = True
+                print(f"[Tracker] Stop detected: {app_name}")
+        
+        instances = {app_name: len(roots) for app_name, roots in app_instances.items()}
+        if instances != self._instances:
+            self._publish(instances)
+        self._write_events()
+        return changed
+    
     def _tracking_loop(self):
         
         while self.tracking_active:
             try:
-
-                current_processes = []
-                for proc in psutil.process_iter(['name', 'exe', 'pid']):
-                    try:
-                        proc_info = proc.info
-                        if proc_info.get('name'):
-                            current_processes.append({
-                                'name': proc_info['name'].lower(),
-                                'exe': proc_info.get('exe', '').lower() if proc_info.get('exe') else '',
-                                'process': proc
-                            })
-                    except (psutil.NoSuchProcess, psutil.AccessDenied):
-                        continue
-                
-
-                for app in self.app_manager.applications:
-                    app_name = app["name"]
-                    exe_path = app["exe"].lower()
-                    
-
-                    if exe_path.endswith('.url') or exe_path.startswith(('http://', 'https://')):
-                        continue
-                    
-                    exe_filename = os.path.basename(exe_path)
-                    
-
-                    is_running = False
-                    matching_process = None
-                    
-                    for proc_info in current_processes:
-                        proc_name = proc_info['name']
-                        proc_exe = proc_info['exe']
-                        
-
-                        if exe_filename == proc_name:
-                            is_running = True
-                            matching_process = proc_info['process']
-                            break
-                        
-
-                        if exe_filename and exe_filename in proc_name:
-                            is_running = True
-                            matching_process = proc_info['process']
-                            break
-                        
-
-                        if proc_exe and exe_path in proc_exe:
-                            is_running = True
-                            matching_process = proc_info['process']
-                            break
-                        
-
-                        exe_base = os.path.splitext(exe_filename)[0]
-                        proc_base = os.path.splitext(proc_name)[0]
-                        if exe_base and proc_base and exe_base == proc_base:
-                            is_running = True
-                            matching_process = proc_info['process']
-                            break
-                    
-
-                    if is_running:
-
-                        if app_name not in self.running_apps:
-                            self._record_session_start(app_name, matching_process)
-                            print(f"[Tracker] Start detected: {app_name}")
-                    else:
-
-                        if app_name in self.running_apps:
-                            self._record_session_end(app_name)
-                            print(f"[Tracker] Stop detected: {app_name}")
-                
-                time.sleep(3)
+                if self.retention_days and self._retention_day != self.clock().date():
+                    self._retention_day = self.clock().date()
+                    self.apply_retention()
+                changed = self.poll()
+                self.scheduler.record_scan(changed)
+                self.scheduler.wait(check=self.running_alive if self.running_apps else None)
             except Exception as e:
                 print(f"Error in tracking loop: {e}")
                 import traceback
                 traceback.print_exc()
-                time.sleep(5)
+                self.scheduler.wait(5)
+    
+    def running_alive(self):
+        """Cheap check between two scans: False once a running app has lost its last process."""
+        return set(self.running_apps) <= self.scanner.live_apps()
+    
+    def retention_horizon(self):
+        """Local midnight before which raw sessions are dropped, or None to keep them all."""
+        if not self.retention_days:
+            return None
+        return datetime.combine((self.clock() - timedelta(days=self.retention_days)).date(), datetime.min.time())
     
-    def _record_session_start(self, app_name, process):
+    def apply_retention(self):
+        """Folds expired sessions away (the daily rollups already hold them) and shrinks the file."""
+        horizon = self.retention_horizon()
+        if horizon is None:
+            return 0
+        try:
+            removed = self.store.prune(horizon)
+        except Exception as e:
+            print(f"Error saving activities: {e}")
+            return 0
+        if removed:
+            self.save_activities()
+            print(f"[Tracker] Compacted {removed} sessions older than {horizon.strftime('%Y-%m-%d')}")
+        return removed
+    
+    def snapshot(self):
+        """Returns the latest ActivitySnapshot; safe to call from any thread."""
+        return self._snapshot
+    
+    def _publish(self, instances=None):
+        
+        if instances is not None:
+            self._instances = instances
+        else:
+            self.data_version += 1
+        self.version += 1
+        self._snapshot = ActivitySnapshot(
+            self.version, self.data_version, self.activities,
+            {app_name: info["start_time"] for app_name, info in self.running_apps.items()},
+            self._instances)
+    
+    def _edit_app(self, app_name):
+        """Returns a private copy of an app entry for the tracker thread to change."""
+        entry = dict(self.activities.get(app_name) or {"total_time": 0, "launch_count": 0, "last_used": ""})
+        entry["daily"] = dict(entry.get("daily", {}))
+        return entry
+    
+    def _commit_app(self, app_name, entry):
+        
+        activities = dict(self.activities)
+        activities[app_name] = entry
+        self.activities = activities
+        self._publish()
+    
+    def _handle_requests(self):
+        """Applies the launches and deletions queued by other threads.
+
+        Returns True if a launched PID started a session.
+        """
+        changed = False
+        while self._requests:
+            request = self._requests.popleft()
+            if request[0] == "remove":
+                self._remove_app(request[1])
+                continue
+            
+            _, app_name, pid, launched_at = request
+            self._count_launch(app_name, launched_at)
+            if not pid or not self.scanner.bind(pid, app_name):
+                continue
+            if app_name not in self.running_apps:
+                self._record_session_start(app_name, start_time=launched_at, count_launch=False)
+                changed = True
+        return changed
+    
+    def _count_launch(self, app_name, launched_at):
+        
+        entry = self._edit_app(app_name)
+        entry["launch_count"] += 1
+        add_daily_launch(entry["daily"], launched_at.date().isoformat())
+        entry["last_used"] = launched_at.isoformat()
+        self._commit_app(app_name, entry)
+        self._log({"type": "launch", "app": app_name, "at": launched_at.isoformat(), "count": 1})
+    
+    def _remove_app(self, app_name):
+        
+        if app_name in self.activities:
+            self.activities = {name: data for name, data in self.activities.items() if name != app_name}
+            self._publish()
+            self._log({"type": "remove", "app": app_name})
+    
+    def _record_session_start(self, app_name, start_time=None, count_launch=True):
         
 
         if app_name in self.running_apps:
             return
             
-        now = datetime.now()
+        now = start_time or self.clock()
         self.running_apps[app_name] = {
-            "start_time": now,
-            "process": process
+            "start_time": now
         }
         
 
-        if app_name not in self.activities:
-            self.activities[app_name] = {
-                "total_time": 0,
-                "launch_count": 0,
-                "last_used": "",
-                "sessions": []
-            }
-        
-        self.activities[app_name]["launch_count"] += 1
-        self.activities[app_name]["last_used"] = now.isoformat()
+        entry = self._edit_app(app_name)
+        if count_launch:
+            entry["launch_count"] += 1
+            add_daily_launch(entry["daily"], now.date().isoformat())
+        entry["last_used"] = now.isoformat()
+        self._commit_app(app_name, entry)
+        self._log({"type": "launch", "app": app_name, "at": now.isoformat(), "count": 1 if count_launch else 0})
         
         print(f"[Tracker] Session started for {app_name} at {now.strftime('%H:%M:%S')}")
     
@@ -198,23 +2021,25 @@ class ActivityTracker:
         if app_name not in self.running_apps:
             return
             
-        start_time = self.running_apps[app_name]["start_time"]
-        end_time = datetime.now()
+        start_time = self.running_apps.pop(app_name)["start_time"]
+        end_time = self.clock()
         duration = (end_time - start_time).total_seconds()
         
 
         if duration < 5:
-            del self.running_apps[app_name]
+            self._publish()
             return
         
 
         if app_name in self.activities:
-            self.activities[app_name]["total_time"] += duration
-            self.activities[app_name]["sessions"].append({
-                "start": start_time,
-                "end": end_time,
-                "duration": duration
-            })
+            entry = self._edit_app(app_name)
+            entry["total_time"] += duration
+            add_daily_session(entry["daily"], start_time.timestamp(), end_time.timestamp())
+            self._commit_app(app_name, entry)
+            self._log({"type": "session", "app": app_name, "start": start_time.isoformat(),
+                       "end": end_time.isoformat(), "duration": duration})
+        else:
+            self._publish()
         
 
         hours = int(duration // 3600)
@@ -229,63 +2054,48 @@ class ActivityTracker:
             duration_str = f"{seconds}s"
         
         print(f"[Tracker] Session ended for {app_name}: {duration_str}")
-        
-        del self.running_apps[app_name]
-        self.save_activities()
     
-    def on_app_launch(self, app_name):
-        
+    def on_app_launch(self, app_name, pid=None):
+        """Records a launch from the UI; the tracker thread applies it."""
+        self._requests.append(("launch", app_name, pid, self.clock()))
+        self.scheduler.poke()
+    
+    def history_progress(self, period_days):
+        """Returns None once sessions covering period_days are in memory.
 
-        if app_name not in self.activities:
-            self.activities[app_name] = {
-                "total_time": 0,
-                "launch_count": 0,
-                "last_used": "",
-                "sessions": []
-            }
-        self.activities[app_name]["launch_count"] += 1
-        self.activities[app_name]["last_used"] = datetime.now().isoformat()
-        self.save_activities()
+        Otherwise starts parsing the older history in the background and
+        returns the fraction done so far.
+        """
+        if self.store.history_loaded or period_days in CALENDAR_PERIODS or period_days <= RECENT_HISTORY_DAYS:
+            return None
+        horizon = self.retention_horizon()
+        if horizon is not None and self.clock() - timedelta(days=period_days) < horizon:
+            return None
+        boundary_day = (self.clock() - timedelta(days=period_days)).date().isoformat()
+        if not any(boundary_day in app_data.get("daily", {}) for app_data in self.snapshot().activities.values()):
+            return None
+        self.store.load_history()
+        return self.store.history_progress or 0.0
     
     def get_statistics(self, period_days=7):
-        
-        cutoff_date = datetime.now() - timedelta(days=period_days)
-        stats = {}
-        
-        for app_name, app_data in self.activities.items():
-
-            recent_sessions = [
-                s for s in app_data.get("sessions", [])
-                if isinstance(s.get("start"), datetime) and s["start"] >= cutoff_date
-            ]
-            
-            period_time = sum(s.get("duration", 0) for s in recent_sessions)
-            period_launches = len(recent_sessions)
-            
-            stats[app_name] = {
-                "total_time": app_data.get("total_time", 0),
-                "period_time": period_time,
-                "total_launches": app_data.get("launch_count", 0),
-                "period_launches": period_launches,
-                "last_used": app_data.get("last_used", ""),
-                "avg_session_time": period_time / period_launches if period_launches > 0 else 0
-            }
-        
-        return stats
+        """Per-app totals over the last period_days, or over one of CALENDAR_PERIODS; see StatsEngine."""
+        return self.stats.get(period_days)
     
     def get_tracking_status(self):
         
+        snapshot = self.snapshot()
         return {
             "active": self.tracking_active,
-            "running_apps": list(self.running_apps.keys()),
-            "total_apps_tracked": len(self.activities)
+            "running_apps": list(snapshot.running_apps),
+            "instances": dict(snapshot.instances),
+            "total_apps_tracked": len(snapshot.activities)
         }
     
     def remove_app_data(self, app_name):
         
-        if app_name in self.activities:
-            del self.activities[app_name]
-            self.save_activities()
+        if app_name in self.snapshot().activities:
+            self._requests.append(("remove", app_name))
+            self.scheduler.poke()
             print(f"[Tracker] Data deleted for: {app_name}")
             return True
         return False
@@ -299,12 +2109,18 @@ class ActivityTracker:
         print(f"  Total apps tracked: {status['total_apps_tracked']}")
 
 
+# calendar period measured by each goal period
+GOAL_PERIODS = {"daily": "today", "weekly": "week", "monthly": "month"}
+
+
 class GoalsManager:
-    def __init__(self, activity_tracker):
+    def __init__(self, activity_tracker, persistence=None):
         self.activity_tracker = activity_tracker
+        self.persistence = persistence
         self.goals_file = "goals_data.json"
         self.goals = self.load_goals()
         self.notifications_shown = {}
+        self._app_categories = {}
         
     def load_goals(self):
         
@@ -319,6 +2135,9 @@ class GoalsManager:
     
     def save_goals(self):
         
+        if self.persistence:
+            self.persistence.mark_dirty(self.goals_file, self.goals, indent=2)
+            return
         try:
             with open(self.goals_file, "w") as f:
                 json.dump(self.goals, f, indent=2)
@@ -390,17 +2209,7 @@ class GoalsManager:
             period = goal["period"]
             
 
-            if period == "daily":
-                days = 1
-            elif period == "weekly":
-                days = 7
-            elif period == "monthly":
-                days = 30
-            else:
-                days = 1
-            
-
-            stats = self.activity_tracker.get_statistics(period_days=days)
+            stats = self.activity_tracker.get_statistics(period_days=GOAL_PERIODS.get(period, "today"))
             
             if app_name not in stats:
                 continue
@@ -486,16 +2295,7 @@ class GoalsManager:
         limit_value = goal["limit_value"]
         period = goal["period"]
         
-        if period == "daily":
-            days = 1
-        elif period == "weekly":
-            days = 7
-        elif period == "monthly":
-            days = 30
-        else:
-            days = 1
-        
-        stats = self.activity_tracker.get_statistics(period_days=days)
+        stats = self.activity_tracker.get_statistics(period_days=GOAL_PERIODS.get(period, "today"))
         
         if app_name not in stats:
             return {
@@ -549,16 +2349,20 @@ class GoalsManager:
 
         for app_name, app_stats in stats.items():
 
-            category = "Others"
-            for cat_id, cat_data in APP_CATEGORIES.items():
+            # the keyword match only depends on the name: done once per app
+            category = self._app_categories.get(app_name)
+            if category is None:
+                category = "Others"
+                for cat_id, cat_data in APP_CATEGORIES.items():
 
-                app_lower = app_name.lower()
-                for keyword in cat_data.get("keywords", []):
-                    if keyword in app_lower:
-                        category = cat_data["name"]
+                    app_lower = app_name.lower()
+                    for keyword in cat_data.get("keywords", []):
+                        if keyword in app_lower:
+                            category = cat_data["name"]
+                            break
+                    if category != "Others":
                         break
-                if category != "Others":
-                    break
+                self._app_categories[app_name] = category
             
             if category not in category_stats:
                 category_stats[category] = {
@@ -737,51 +2541,60 @@ APP_CATEGORIES = {
     }
 }
 
-def ensure_data_schema(data):
-
-    if isinstance(data, list):
-        applications = data
-        groups = {
-            DEFAULT_GROUP_ID: {
-                "id": DEFAULT_GROUP_ID,
-                "name": "All",
-                "icon": None,
-                "order": 0
-            }
+def _schema_v1(data):
+    """Fills the defaults of every app and group and drops the old group colors."""
+    data.setdefault("applications", [])
+    data.setdefault("groups", {})
+    if DEFAULT_GROUP_ID not in data["groups"]:
+        data["groups"][DEFAULT_GROUP_ID] = {
+            "id": DEFAULT_GROUP_ID,
+            "name": "All",
+            "icon": None,
+            "order": 0
         }
 
-        for i, app in enumerate(applications):
-            if "group_id" not in app:
-                app["group_id"] = DEFAULT_GROUP_ID
-            app.setdefault("order", i)
-        return {"applications": applications, "groups": groups}
-    elif isinstance(data, dict):
-
-        data.setdefault("applications", [])
-        data.setdefault("groups", {})
-        if DEFAULT_GROUP_ID not in data["groups"]:
-            data["groups"][DEFAULT_GROUP_ID] = {
-                "id": DEFAULT_GROUP_ID,
-                "name": "All",
-                "icon": None,
-                "order": 0
-            }
+    for i, app in enumerate(data["applications"]):
+        app.setdefault("group_id", DEFAULT_GROUP_ID)
+        app.setdefault("order", i)
+
+
+    ordered_groups = sorted(data["groups"].values(), key=lambda g: (0 if g["id"] == DEFAULT_GROUP_ID else 1, g.get("name","").lower()))
+    for idx, g in enumerate(ordered_groups):
+        data["groups"][g["id"]].setdefault("order", idx)
 
-        for i, app in enumerate(data["applications"]):
-            app.setdefault("group_id", DEFAULT_GROUP_ID)
-            app.setdefault("order", i)
+    for gid, g in list(data["groups"].items()):
+        if "color" in g:
+            g.pop("color", None)
 
 
-        ordered_groups = sorted(data["groups"].values(), key=lambda g: (0 if g["id"] == DEFAULT_GROUP_ID else 1, g.get("name","").lower()))
-        for idx, g in enumerate(ordered_groups):
-            data["groups"][g["id"]].setdefault("order", idx)
+# one-time migrations, in order: a file at schema_version N only runs
+# the migrations from index N on
+SCHEMA_MIGRATIONS = [_schema_v1]
+SCHEMA_VERSION = len(SCHEMA_MIGRATIONS)
 
-        for gid, g in list(data["groups"].items()):
-            if "color" in g:
-                g.pop("color", None)
+def data_schema_version(data):
+
+    if isinstance(data, dict):
+        return data.get("schema_version", 0)
+    return 0
+
+def ensure_data_schema(data):
+
+    version = data_schema_version(data)
+    if version >= SCHEMA_VERSION:
+        # a file from a newer XClient is used as is: migrating it back would downgrade it
         return data
-    else:
-        return ensure_data_schema([])
+
+    if isinstance(data, list):
+        # legacy files are a bare list of applications
+        data = {"applications": data}
+    elif not isinstance(data, dict):
+        data = {}
+
+    for migrate in SCHEMA_MIGRATIONS[version:]:
+        migrate(data)
+    data["schema_version"] = SCHEMA_VERSION
+    return data
 
 def color_or_default(c, fallback="#1e2124"):
     return c if c else fallback
@@ -1101,6 +2914,8 @@ class XClientApp:
 
 
         loaded = self.load_raw_data()
+        schema_version = data_schema_version(loaded)
+        self.newer_schema = schema_version > SCHEMA_VERSION
         data = ensure_data_schema(loaded)
         self.applications = data["applications"]
         self.groups = data["groups"]
@@ -1108,11 +2923,18 @@ class XClientApp:
         self.search_query = ""
         
 
-        self.activity_tracker = ActivityTracker(self)
+        self.save_delay = data.get("settings", {}).get("save_delay", 1.0)
+        self.persistence = PersistenceService(delay=self.save_delay)
+        self.tracker_max_interval = data.get("settings", {}).get("tracker_max_interval", 3)
+        self.activity_backend = data.get("settings", {}).get("activity_backend", "json")
+        self.activity_retention_days = data.get("settings", {}).get("activity_retention_days", 0)
+        self.activity_tracker = ActivityTracker(self, max_poll_interval=self.tracker_max_interval,
+                                                backend=self.activity_backend,
+                                                retention_days=self.activity_retention_days)
         self.activity_tracker.start_tracking()
         
 
-        self.goals_manager = GoalsManager(self.activity_tracker)
+        self.goals_manager = GoalsManager(self.activity_tracker, persistence=self.persistence)
         
 
         self.auto_categorize = data.get("settings", {}).get("auto_categorize", True)
@@ -1122,6 +2944,12 @@ class XClientApp:
         
 
         self._initialize_default_categories()
+        if self.newer_schema:
+            messagebox.showwarning("Warning", "applications.json was written by a newer version of XClient. "
+                                   "It is left untouched: changes made in this session will not be saved.")
+        elif schema_version < SCHEMA_VERSION:
+            # saved once in the current schema, so the next start is a plain parse
+            self.save_all()
 
 
         style = ttk.Style()
@@ -1826,6 +3654,7 @@ class XClientApp:
 
         def load_json_file(file_name):
             try:
+                self.persistence.flush()
                 with open(file_name, 'r', encoding='utf-8') as f:
                     content = json.load(f)
                     edit_text.delete('1.0', tk.END)
@@ -1937,6 +3766,7 @@ class XClientApp:
         return config
 
     def _apply_json_config(self, config):
+        self.newer_schema = data_schema_version(config) > SCHEMA_VERSION
         data = ensure_data_schema(config)
         
 
@@ -2070,7 +3900,7 @@ class XClientApp:
             
 
             if period_str == "Today":
-                days = 1
+                days = "today"
             elif period_str == "7 days":
                 days = 7
             elif period_str == "30 days":
@@ -2083,6 +3913,25 @@ class XClientApp:
                 widget.destroy()
             
 
+            progress = self.activity_tracker.history_progress(days)
+            if progress is not None:
+                loading_label = tk.Label(scrollbar_frame, text=f"Loading older activity... {int(progress * 100)}%",
+                                         fg="#9aa0a6", bg="#1e2124", font=("Arial", 12))
+                loading_label.pack(pady=50)
+                
+                def wait_for_history():
+                    if not loading_label.winfo_exists():
+                        return
+                    progress = self.activity_tracker.history_progress(days)
+                    if progress is None:
+                        update_stats(period_str)
+                    else:
+                        loading_label.config(text=f"Loading older activity... {int(progress * 100)}%")
+                        win.after(100, wait_for_history)
+                
+                win.after(100, wait_for_history)
+                return
+            
             stats = self.activity_tracker.get_statistics(period_days=days)
             
             if not stats:
@@ -3474,7 +5323,8 @@ class XClientApp:
             if selected_item is None:
                 raise IndexError()
             selected_app = self.applications[selected_item]
-            self._open_path_or_command(selected_app["exe"])
+            process = self._open_path_or_command(selected_app["exe"])
+            self.activity_tracker.on_app_launch(selected_app["name"], pid=process.pid if process else None)
         except IndexError:
             messagebox.showwarning("Error", "No application selected.")
         except Exception as e:
@@ -3731,23 +5581,32 @@ class XClientApp:
         try:
             if 0 <= index < len(self.applications):
                 app = self.applications[index]
-                self._open_path_or_command(app["exe"])
+                process = self._open_path_or_command(app["exe"])
 
-                self.activity_tracker.on_app_launch(app["name"])
+                self.activity_tracker.on_app_launch(app["name"], pid=process.pid if process else None)
         except Exception as e:
             messagebox.showerror("Error", f"Could not launch the application: {str(e)}")
 
     def save_all(self):
-        data = {
+        """Schedules an applications.json write; see PersistenceService."""
+        if self.newer_schema:
+            return
+        self.persistence.mark_dirty("applications.json", self._applications_data(), indent=2)
+    
+    def _applications_data(self):
+        return {
+            "schema_version": SCHEMA_VERSION,
             "applications": self.applications, 
             "groups": self.groups,
             "settings": {
                 "auto_categorize": self.auto_categorize,
-                "hide_completed_goals": self.hide_completed_goals
+                "hide_completed_goals": self.hide_completed_goals,
+                "tracker_max_interval": self.tracker_max_interval,
+                "activity_backend": self.activity_backend,
+                "activity_retention_days": self.activity_retention_days,
+                "save_delay": self.save_delay
             }
         }
-        with open("applications.json", "w") as f:
-            json.dump(data, f, indent=2)
     
     def _initialize_default_categories(self):
         
@@ -3853,7 +5712,7 @@ class XClientApp:
     def cleanup_orphaned_stats(self):
         
         app_names = {app["name"] for app in self.applications}
-        tracked_apps = set(self.activity_tracker.activities.keys())
+        tracked_apps = set(self.activity_tracker.snapshot().activities)
         goal_apps = {goal["app_name"] for goal in self.goals_manager.goals.values()}
         
 
@@ -4742,6 +6601,7 @@ class XClientApp:
 
         if hasattr(self, 'goals_manager'):
             self.goals_manager.save_goals()
+        self.persistence.flush()
         self.system_tray_icon.stop()
         self.root.quit()
 
@@ -5016,7 +6876,8 @@ class XClientApp:
                 self._update_goals_progress_display()
         
 
-        self.root.after(300000, self._periodic_goals_check)
+        # goal progress includes running sessions, so limits are checked every minute
+        self.root.after(60000, self._periodic_goals_check)
     
     def _show_windows_notification(self, message, alert_type="info"):
         
@@ -5212,13 +7073,12 @@ class XClientApp:
                 creationflags = 0
                 if hasattr(subprocess, "CREATE_NO_WINDOW"):
                     creationflags = subprocess.CREATE_NO_WINDOW
-                subprocess.Popen(path,
-                                 stdout=subprocess.DEVNULL,
-                                 stderr=subprocess.DEVNULL,
-                                 stdin=subprocess.DEVNULL,
-                                 creationflags=creationflags,
-                                 shell=False)
-                return
+                return subprocess.Popen(path,
+                                        stdout=subprocess.DEVNULL,
+                                        stderr=subprocess.DEVNULL,
+                                        stdin=subprocess.DEVNULL,
+                                        creationflags=creationflags,
+                                        shell=False)
 
 
             try: